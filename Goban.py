@@ -8,110 +8,281 @@
 
     (c) Laurent SIMON 2019 -- 2020
 
+    Boards can be of any size from 2x2 to 19x19 (Board(size=13)), 9x9 by default.
+
+    Games are scored with the area (Tromp-Taylor) rules, with a komi of 7.5 by default.
+
     Known Limitations:
-     - No early detection of endgames (only stops when no stone can be put on the board, or superKo)
+     - No early detection of endgames in the board itself (only stops when no stone
+       can be put on the board, or superKo). See endgame.py for settled positions.
     '''
 
 from __future__ import print_function # Used to help cython work well
 import numpy as np
 import random
+import functools
 
 def getProperRandom():
     return np.random.randint(np.iinfo(np.int64).max, dtype='int64')
 
+LETTERS = "ABCDEFGHJKLMNOPQRST" # no I, as usual in Go
+MAXBOARDSIZE = len(LETTERS)
+
+class BoardTables:
+    ''' Everything that only depends on the size of the board: neighbors, diagonals,
+        Zobrist values, names of the points, hoshi. The tables are built once per size (see
+        boardTables) and shared by all the boards of this size, so they must never
+        be written.
+
+        The Zobrist values come from a generator seeded by the size: the hashes are
+        the same from one process (or one run) to the other.
+
+        The 8 symmetries of the board are numbered by 3 bits, applied in this order:
+        1 swaps the lines and the columns, 2 mirrors the lines, 4 mirrors the
+        columns. symmetryHashes[fcoord][color-1][t] is the Zobrist value of the
+        image of the point by the symmetry t, so that the hash of the board seen
+        through t can be updated as the move is played.
+    '''
+
+    def __init__(self, size):
+        if not 2 <= size <= MAXBOARDSIZE:
+            raise ValueError("Board size must be between 2 and %d, not %d" % (MAXBOARDSIZE, size))
+        self.size = size
+        self.nbPoints = size * size
+
+        #Building fast structures for accessing neighborhood
+        neighbors = []
+        neighborsEntries = []
+        for fcoord in range(self.nbPoints):
+            neighborsEntries.append(len(neighbors))
+            neighbors.extend(self.pointNeighbors(fcoord))
+            neighbors.append(-1) # Sentinelle
+        self.neighbors = tuple(neighbors)
+        self.neighborsEntries = tuple(neighborsEntries)
+        self.nbNeighbors = tuple(len(self.pointNeighbors(fcoord)) for fcoord in range(self.nbPoints))
+        self.diagonals = tuple(tuple(self.pointDiagonals(fcoord)) for fcoord in range(self.nbPoints))
+
+        rng = random.Random(0x60BA * MAXBOARDSIZE + size)
+        self.positionHashes = tuple((rng.getrandbits(64), rng.getrandbits(64)) for _ in range(self.nbPoints))
+        self.emptyHash = rng.getrandbits(64)
+        self.passHash = rng.getrandbits(64)
+
+        self.symmetries = tuple(tuple(self.transformPoint(transform, fcoord) for fcoord in range(self.nbPoints))
+            for transform in range(8))
+        self.inverseSymmetries = tuple(next(u for u in range(8)
+            if all(self.symmetries[u][image] == fcoord for fcoord, image in enumerate(self.symmetries[t])))
+            for t in range(8))
+        self.symmetryHashes = tuple(tuple(tuple(self.positionHashes[self.symmetries[t][fcoord]][c] for t in range(8))
+            for c in range(2)) for fcoord in range(self.nbPoints))
+
+        # names[fcoord], with "PASS" last so that names[-1] is the name of the pass
+        self.letters = LETTERS[:size]
+        self.names = tuple(self.letters[fcoord % size] + str(size - fcoord // size)
+            for fcoord in range(self.nbPoints)) + ("PASS",)
+        self.nameToFcoord = {name: fcoord for fcoord, name in enumerate(self.names[:-1])}
+        self.nameToFcoord["PASS"] = -1
+        self.specialPoints = self.hoshi(size)
+
+    def pointNeighbors(self, fcoord):
+        x, y = divmod(fcoord, self.size)
+        neighbors = ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
+        return [c[0] * self.size + c[1] for c in neighbors
+            if 0 <= c[0] < self.size and 0 <= c[1] < self.size]
+
+    # Image of the point by the symmetry transform (see the class documentation)
+    def transformPoint(self, transform, fcoord):
+        x, y = divmod(fcoord, self.size)
+        if transform & 1:
+            x, y = y, x
+        if transform & 2:
+            x = self.size - 1 - x
+        if transform & 4:
+            y = self.size - 1 - y
+        return x * self.size + y
+
+    def pointDiagonals(self, fcoord):
+        x, y = divmod(fcoord, self.size)
+        diagonals = ((x+1, y+1), (x+1, y-1), (x-1, y+1), (x-1, y-1))
+        return [c[0] * self.size + c[1] for c in diagonals
+            if 0 <= c[0] < self.size and 0 <= c[1] < self.size]
+
+    # The points marked with a + by prettyPrint: on the 3rd line (4th line from
+    # 13x13), the center and, on large boards, the middle of the sides
+    @staticmethod
+    def hoshi(size):
+        if size < 5:
+            return set()
+        edge = 1 if size < 7 else 2 if size < 13 else 3
+        lines = [edge, size - 1 - edge]
+        if size % 2 == 1 and size >= 15:
+            lines.append(size // 2)
+        points = set((l, c) for l in lines for c in lines)
+        if size % 2 == 1:
+            points.add((size // 2, size // 2))
+        return points
+
+_boardTables = {}
+
+def boardTables(size):
+    if size not in _boardTables:
+        _boardTables[size] = BoardTables(size)
+    return _boardTables[size]
+
+class sizedStaticMethod:
+    ''' Static method on the coordinates of a board. Called on a board, it works with
+        the size of this board. Called on the class (Board.coordToName(fcoord)), it
+        uses the default size Board._BOARDSIZE. The function gets the BoardTables
+        of the size as first argument.
+    '''
+
+    def __init__(self, function):
+        self._function = function
+
+    def __get__(self, board, cls=None):
+        tables = board._tables if board is not None else boardTables(cls._BOARDSIZE)
+        return functools.partial(self._function, tables)
+
 class Board:
     _BLACK = 1
     _WHITE = 2
     _EMPTY = 0
-    _BOARDSIZE = 9 # Used in static methods, do not write it
+    _BOARDSIZE = 9 # Default size, used in static methods called on the class, do not write it
+    _KOMI = 7.5 # Default komi, given to white by the area scoring
     _DEBUG = False
 
-    def __init__(self):
+    # Goban.Board(backend="bitboard") returns a bitGoban.BitBoard, with the same
+    # public API but storing the stones in two integers. The other backend is
+    # "array" (this class).
+    def __new__(cls, backend="array", size=None, komi=None):
+        if backend == "bitboard":
+            import bitGoban # not at the top: bitGoban imports this module
+            return bitGoban.BitBoard(size, komi)
+        if backend != "array":
+            raise ValueError("Unknown board backend %r (array or bitboard)" % (backend,))
+        return super(Board, cls).__new__(cls)
+
+    # size is the size of the board (up to 19), Board._BOARDSIZE if not given.
+    # The size of a board is in its _BOARDSIZE attribute. komi is Board._KOMI if
+    # not given.
+    def __init__(self, backend="array", size=None, komi=None):
+      tables = boardTables(size or Board._BOARDSIZE)
+      self._tables = tables
+      self._BOARDSIZE = tables.size
+      self._komi = Board._KOMI if komi is None else komi
+      nbPoints = tables.nbPoints
+
       self._nbWHITE = 0
       self._nbBLACK = 0
       self._capturedWHITE = 0
       self._capturedBLACK = 0
 
       self._nextPlayer = self._BLACK
-      self._board = np.zeros((Board._BOARDSIZE**2), dtype='int8')
+      self._board = np.zeros((nbPoints), dtype='int8')
 
       self._lastPlayerHasPassed = False
       self._gameOver = False
 
-      self._stringUnionFind = np.full((Board._BOARDSIZE**2), -1, dtype='int16')
-      self._stringLiberties = np.full((Board._BOARDSIZE**2), -1, dtype='int16')
-      self._stringSizes = np.full((Board._BOARDSIZE**2), -1, dtype='int16')
-
-      self._empties = set(range(Board._BOARDSIZE **2))
-
-      # Zobrist values for the hashes. I use np.int64 to be machine independant
-      self._positionHashes = np.empty((Board._BOARDSIZE**2, 2), dtype='int64')
-      for x in range(Board._BOARDSIZE**2):
-            for c in range(2):
-                self._positionHashes[x][c] = getProperRandom()
-      self._currentHash = getProperRandom()
-      self._passHash = getProperRandom()
-
-      self._seenHashes = set()
+      self._stringUnionFind = [-1] * nbPoints
+      # Liberties of each string, as a bitset of points (bit fcoord is set if fcoord
+      # is a liberty of the string)
+      self._stringLiberties = [0] * nbPoints
+      self._stringSizes = [-1] * nbPoints
+      # The stones of each string form a circular list: _stringNext[fcoord] is the
+      # next stone of the string of fcoord (fcoord itself for a single stone)
+      self._stringNext = [-1] * nbPoints
+
+      self._empties = set(range(nbPoints))
+
+      # Zobrist values for the hashes (Python integers of 64 bits, the same for all
+      # the boards of this size)
+      self._positionHashes = tables.positionHashes
+      self._currentHash = tables.emptyHash
+      self._passHash = tables.passHash
+      # Hashes of the board seen through the 8 symmetries (the first one is
+      # _currentHash), see canonicalHash
+      self._symmetryZobrist = tables.symmetryHashes
+      self._symmetryHashes = (tables.emptyHash,) * 8
+
+      # Hashes of the positions of the game (superko), with their number of
+      # occurrences: pop() must not forget a position also reached before
+      self._seenHashes = {}
 
       self._historyMoveNames = []
       self._trailMoves = [] # data structure used to push/pop the moves
+      self._trail = [] # undo log of (array, index, old value) written since the first push
+
+      # Fast structures for accessing neighborhood (shared, read only)
+      self._neighbors = tables.neighbors
+      self._neighborsEntries = tables.neighborsEntries
+      self._names = tables.names
+
+      # Number of neighbors of each point, and how many of them are empty (updated
+      # incrementally by putStone and captureString, for all the points)
+      self._nbNeighbors = tables.nbNeighbors
+      self._nbEmptyNeighbors = list(self._nbNeighbors)
 
-      #Building fast structures for accessing neighborhood
-      self._neighbors = []
-      self._neighborsEntries = []
-      for nl in [self.getNeighbors(fcoord) for fcoord in range(Board._BOARDSIZE**2)] :
-          self._neighborsEntries.append(len(self._neighbors))
-          for n in nl:
-              self._neighbors.append(n)
-          self._neighbors.append(-1) # Sentinelle
-      self._neighborsEntries = np.array(self._neighborsEntries, dtype='int16')
-      self._neighbors = np.array(self._neighbors, dtype='int8')
+      self._resetRegions()
 
+    # Only the scalar status is saved here: the arrays modified by the move are
+    # logged cell by cell in self._trail (see _write) and replayed backwards by popBoard
     def pushBoard(self):
-        currentStatus = []
-        currentStatus.append(self._nbWHITE)
-        currentStatus.append(self._nbBLACK)
-        currentStatus.append(self._capturedWHITE)
-        currentStatus.append(self._capturedBLACK)
-        currentStatus.append(self._nextPlayer)
-        currentStatus.append(self._board.copy())
-        currentStatus.append(self._gameOver)
-        currentStatus.append(self._lastPlayerHasPassed)
-        currentStatus.append(self._stringUnionFind.copy())
-        currentStatus.append(self._stringLiberties.copy())
-        currentStatus.append(self._stringSizes.copy())
-        currentStatus.append(self._empties.copy())
-        currentStatus.append(self._currentHash)
-        self._trailMoves.append(currentStatus)
+        self._trailMoves.append((len(self._trail), self._nbWHITE, self._nbBLACK,
+            self._capturedWHITE, self._capturedBLACK, self._nextPlayer, self._gameOver,
+            self._lastPlayerHasPassed, self._currentHash, self._symmetryHashes))
 
     def popBoard(self):
-        oldStatus = self._trailMoves.pop()
-        self._currentHash = oldStatus.pop()
-        self._empties = oldStatus.pop()
-        self._stringSizes = oldStatus.pop()
-        self._stringLiberties = oldStatus.pop()
-        self._stringUnionFind = oldStatus.pop()
-        self._lastPlayerHasPassed = oldStatus.pop()
-        self._gameOver = oldStatus.pop()
-        self._board = oldStatus.pop()
-        self._nextPlayer = oldStatus.pop()
-        self._capturedBLACK = oldStatus.pop()
-        self._capturedWHITE = oldStatus.pop()
-        self._nbBLACK = oldStatus.pop()
-        self._nbWHITE = oldStatus.pop()
+        (mark, self._nbWHITE, self._nbBLACK, self._capturedWHITE, self._capturedBLACK,
+            self._nextPlayer, self._gameOver, self._lastPlayerHasPassed,
+            self._currentHash, self._symmetryHashes) = self._trailMoves.pop()
+        trail = self._trail
+        board = self._board
+        while len(trail) > mark:
+            array, index, value = trail.pop()
+            array[index] = value
+            if array is board: # the set of empties follows the board cells
+                if value == Board._EMPTY:
+                    self._empties.add(index)
+                else:
+                    self._empties.discard(index)
         self._historyMoveNames.pop()
 
+    # All the writes in the board arrays during a move must go through this method
+    def _write(self, array, index, value):
+        self._trail.append((array, index, array[index]))
+        array[index] = value
+
     def getPositionHash(self, fcoord, color):
         return self._positionHashes[fcoord][color-1]
 
-    @staticmethod
-    def flatten(coord):
-        return Board._BOARDSIZE * coord[0] + coord[1]
+    # Adds or removes a stone in the hashes of the symmetric boards
+    def _toggleSymmetryHashes(self, fcoord, color):
+        self._symmetryHashes = tuple(map(int.__xor__, self._symmetryHashes,
+            self._symmetryZobrist[fcoord][color-1]))
 
-    @staticmethod
-    def unflatten(fcoord):
-        return divmod(fcoord, Board._BOARDSIZE)
+    # The same key for the 8 symmetric positions (the smallest of their hashes),
+    # and the symmetry giving it: the points of this board are seen at
+    # transformFcoord(fcoord, transform) in the canonical position
+    def canonicalHash(self):
+        key = min(self._symmetryHashes)
+        return key, self._symmetryHashes.index(key)
+
+    # Image of fcoord by the symmetry (PASS, -1, is left as it is)
+    @sizedStaticMethod
+    def transformFcoord(tables, fcoord, transform):
+        return fcoord if fcoord == -1 else tables.symmetries[transform][fcoord]
+
+    # From the canonical position back to the board: the inverse symmetry
+    @sizedStaticMethod
+    def untransformFcoord(tables, fcoord, transform):
+        return fcoord if fcoord == -1 else tables.symmetries[tables.inverseSymmetries[transform]][fcoord]
+
+    @sizedStaticMethod
+    def flatten(tables, coord):
+        return tables.size * coord[0] + coord[1]
+
+    @sizedStaticMethod
+    def unflatten(tables, fcoord):
+        return divmod(fcoord, tables.size)
 
     @staticmethod
     def flip(player):
@@ -127,53 +298,53 @@ class Board:
             return "white"
         return "???"
 
-    # Used only in init to build the neighborsEntries datastructure
     def getNeighbors(self, fcoord):
-        x, y = Board.unflatten(fcoord)
-        neighbors = ((x+1, y), (x-1, y), (x, y+1), (x, y-1))
-        return [Board.flatten(c) for c in neighbors if self._isOnBoard(c[0], c[1])]
+        return self._tables.pointNeighbors(fcoord)
 
     # for union find structure, recover the number of the current string of stones
+    # No path compression: it would have to be logged for pop(). Strings are merged
+    # by size instead, so the trees stay shallow.
     def getStringOfStone(self, fcoord):
-        successives = []
         while self._stringUnionFind[fcoord] != -1:
             fcoord = self._stringUnionFind[fcoord]
-            successives.append(fcoord)
-        if len(successives) > 1:
-            for fc in successives[:-1]:
-                self._stringUnionFind[fc] = fcoord
         return fcoord
 
+    # str2 is merged into str1. The liberties and size of str2 are left as they are:
+    # only the values of the roots are meaningful, and pop() will need them again.
+    # The two circular lists of stones are joined by swapping the next stones of
+    # the roots.
     def mergeStringNumber(self, str1, str2):
         #print("merge ", str1, str2)
-        self._stringLiberties[str1] += self._stringLiberties[str2]
-        self._stringLiberties[str2] = -1
-        self._stringSizes[str1] += self._stringSizes[str2]
-        self._stringSizes[str2] = -1
+        self._write(self._stringLiberties, str1, self._stringLiberties[str1] | self._stringLiberties[str2])
+        self._write(self._stringSizes, str1, self._stringSizes[str1] + self._stringSizes[str2])
+        next1 = self._stringNext[str1]
+        self._write(self._stringNext, str1, self._stringNext[str2])
+        self._write(self._stringNext, str2, next1)
         assert self._stringUnionFind[str2] == -1
-        self._stringUnionFind[str2] = str1
+        self._write(self._stringUnionFind, str2, str1)
 
     def putStone(self, fcoord, color):
-        self._board[fcoord] = color
+        self._write(self._board, fcoord, color)
         self._currentHash ^= self.getPositionHash(fcoord, color)
+        self._toggleSymmetryHashes(fcoord, color)
         if self._DEBUG:
             assert fcoord in self._empties
         self._empties.remove(fcoord)
 
-        nbEmpty = 0
-        nbSameColor = 0
+        liberties = 0
         i = self._neighborsEntries[fcoord]
         while self._neighbors[i] != -1:
-            n = self._board[self._neighbors[i]]
+            fn = self._neighbors[i]
+            self._write(self._nbEmptyNeighbors, fn, self._nbEmptyNeighbors[fn] - 1)
+            n = self._board[fn]
             if  n == Board._EMPTY:
-                nbEmpty += 1
-            elif n == color:
-                nbSameColor += 1
+                liberties |= 1 << fn
             i += 1
-        nbOtherColor = 4 - nbEmpty - nbSameColor
         currentString = fcoord
-        self._stringLiberties[currentString] = nbEmpty
-        self._stringSizes[currentString] = 1
+        self._write(self._stringLiberties, currentString, liberties)
+        self._write(self._stringSizes, currentString, 1)
+        self._write(self._stringNext, currentString, fcoord)
+        bit = 1 << fcoord
 
         stringWithNoLiberties = [] # String to capture (if applies)
         i = self._neighborsEntries[fcoord]
@@ -181,13 +352,17 @@ class Board:
             fn = self._neighbors[i]
             if self._board[fn] == color: # We may have to merge the strings
                 stringNumber = self.getStringOfStone(fn)
-                self._stringLiberties[stringNumber] -= 1
+                if self._stringLiberties[stringNumber] & bit:
+                    self._write(self._stringLiberties, stringNumber, self._stringLiberties[stringNumber] ^ bit)
                 if currentString != stringNumber:
+                    if self._stringSizes[stringNumber] < self._stringSizes[currentString]:
+                        stringNumber, currentString = currentString, stringNumber
                     self.mergeStringNumber(stringNumber, currentString)
                 currentString = stringNumber
             elif self._board[fn] != Board._EMPTY: # Other color
                 stringNumber = self.getStringOfStone(fn)
-                self._stringLiberties[stringNumber] -= 1
+                if self._stringLiberties[stringNumber] & bit:
+                    self._write(self._stringLiberties, stringNumber, self._stringLiberties[stringNumber] ^ bit)
                 if self._stringLiberties[stringNumber] == 0:
                     if stringNumber not in stringWithNoLiberties: # We may capture more than one string
                         stringWithNoLiberties.append(stringNumber)
@@ -197,104 +372,124 @@ class Board:
             string, reached = self.breadthSearchStringAndReached(fcoord)
             assert self._board[fcoord] == color
             assertString = self.getStringOfStone(fcoord)
-            looseLiberty = 0 # Checks that my liberties are loosely counted
             for fc in string:
                 assert assertString == self.getStringOfStone(fc)
                 i = self._neighborsEntries[fc]
                 while self._neighbors[i] != -1:
                     fn = self._neighbors[i]
                     assert self._board[fn] == color or fn in reached
-                    if self._board[fn] == Board._EMPTY:
-                        looseLiberty += 1
                     i += 1
-            assert looseLiberty == self._stringLiberties[assertString]
-            realLiberty = sum(1 for fc in reached if self._board[fc] == Board._EMPTY)
-            assert self._stringLiberties[assertString] >= realLiberty
+            # Checks that my liberties are exactly the empty points reached
+            assert self._stringLiberties[assertString] == sum(1 << fc for fc in reached
+                if self._board[fc] == Board._EMPTY)
             assert len(string) == self._stringSizes[assertString]
+            assert sorted(string) == sorted(self.stringStones(fcoord))
 
         return stringWithNoLiberties
 
     def reset(self):
-        self.__init__()
+        self.__init__(size=self._BOARDSIZE, komi=self._komi)
+
+    # A board in the same status, that can be played (and popped) independently.
+    # The tables of the size are shared, the mutable arrays are copied in bulk and
+    # the undo log is rebuilt on the copies. With withUndo=False, the moves pushed
+    # before can not be popped from the copy, but it is much faster to build late
+    # in the game (the undo log is not copied).
+    def copy(self, withUndo=True):
+        other = object.__new__(type(self))
+        other.__dict__.update(self.__dict__) # the tables and the scalar status
+        other._board = self._board.copy()
+        other._stringUnionFind = self._stringUnionFind[:]
+        other._stringLiberties = self._stringLiberties[:]
+        other._stringSizes = self._stringSizes[:]
+        other._stringNext = self._stringNext[:]
+        other._nbEmptyNeighbors = self._nbEmptyNeighbors[:]
+        other._empties = set(self._empties)
+        other._seenHashes = dict(self._seenHashes)
+        other._historyMoveNames = self._historyMoveNames[:]
+        other._resetRegions() # the regions are computed again when needed
+        if not withUndo:
+            other._trailMoves = []
+            other._trail = []
+            return other
+        other._trailMoves = self._trailMoves[:]
+        copies = {id(self._board): other._board, id(self._stringUnionFind): other._stringUnionFind,
+            id(self._stringLiberties): other._stringLiberties, id(self._stringSizes): other._stringSizes,
+            id(self._stringNext): other._stringNext,
+            id(self._nbEmptyNeighbors): other._nbEmptyNeighbors}
+        other._trail = [(copies[id(array)], index, value) for array, index, value in self._trail]
+        return other
+
+    clone = copy
 
 
     def _isOnBoard(self,x,y):
-        return x >= 0 and x < Board._BOARDSIZE and y >= 0 and y < Board._BOARDSIZE
+        return x >= 0 and x < self._BOARDSIZE and y >= 0 and y < self._BOARDSIZE
 
+    # The move is legal (not a suicide) if a neighbor is empty, if it captures an
+    # opponent string (whose only liberty is fcoord) or if a friend string keeps
+    # another liberty
     def isSuicide(self, fcoord, color):
-        opponent = Board.flip(color)
+        bit = 1 << fcoord
         i = self._neighborsEntries[fcoord]
-        libertiesFriends = {}
-        libertiesOpponents = {}
         while self._neighbors[i] != -1:
             fn = self._neighbors[i]
-            if self._board[fn] == Board._EMPTY:
-                return False
-            string = self.getStringOfStone(fn)
-            if self._board[fn] == color: # check that we don't kill the whole zone
-                if string not in libertiesFriends:
-                    libertiesFriends[string] = self._stringLiberties[string] - 1
-                else:
-                    libertiesFriends[string] -= 1
-            else:
-                if Board._DEBUG:
-                    assert self._board[fn] == opponent
-                if string not in libertiesOpponents:
-                    libertiesOpponents[string] = self._stringLiberties[string] - 1
-                else:
-                    libertiesOpponents[string] -= 1
             i += 1
-
-        for s in libertiesOpponents:
-            if libertiesOpponents[s] == 0:
+            n = self._board[fn]
+            if n == Board._EMPTY:
+                return False
+            liberties = self._stringLiberties[self.getStringOfStone(fn)]
+            if n == color:
+                if liberties != bit:
+                    return False
+            elif liberties == bit:
                 return False # At least one capture right after this move, it is legal
-
-        if len(libertiesFriends) == 0: # No a single friend there...
-            return True
-
-        # Now checks that when we connect all the friends, we don't create
-        # a zone with 0 liberties
-        sumLibertiesFriends = 0
-        for s in libertiesFriends:
-            sumLibertiesFriends += libertiesFriends[s]
-        if sumLibertiesFriends == 0:
-            return True # At least one friend zone will be captured right after this move, it is unlegal
-
-        return False
+        return True
 
     # Checks if the move leads to an already seen board
     def isSuperKo(self, fcoord, color):
         # Check if it is a complex move (if it takes at least a stone)
         tmpHash = self._currentHash ^ self.getPositionHash(fcoord, color)
         assert self._currentHash == tmpHash ^ self.getPositionHash(fcoord, color)
+        bit = 1 << fcoord
         i = self._neighborsEntries[fcoord]
-        libertiesOpponents = {}
+        captured = []
         opponent = Board.flip(color)
         while self._neighbors[i] != -1:
             fn = self._neighbors[i]
-            #print("superko looks at ", self.coordToName(fn), "for move", self.coordToName(fcoord))
             if self._board[fn] == opponent:
                 s = self.getStringOfStone(fn)
-                #print("superko sees string", self.coordToName(s))
-                if s not in libertiesOpponents:
-                    libertiesOpponents[s] = self._stringLiberties[s] - 1
-                else:
-                    libertiesOpponents[s] -= 1
+                if self._stringLiberties[s] == bit and s not in captured: # fcoord is its last liberty
+                    captured.append(s)
             i += 1
 
-        for s in libertiesOpponents:
-            if libertiesOpponents[s] == 0:
-                #print("superko computation for move ", self.coordToName(fcoord), ":")
-                for fn in self.breadthSearchString(s):
-                    #print(self.coordToName(fn)+" ", end="")
-                    assert self._board[fn] == opponent
-                    tmpHash ^= self.getPositionHash(fn, opponent)
-                #print()
+        for s in captured:
+            for fn in self.stringStones(s):
+                assert self._board[fn] == opponent
+                tmpHash ^= self.getPositionHash(fn, opponent)
 
         if tmpHash in self._seenHashes:
             return True, tmpHash
         return False, tmpHash
 
+    # Liberties of the string of the stone on fcoord, as a bitset of points
+    def stringLiberties(self, fcoord):
+        return self._stringLiberties[self.getStringOfStone(fcoord)]
+
+    def libertyCount(self, fcoord):
+        return bin(self.stringLiberties(fcoord)).count("1")
+
+    def isInAtari(self, fcoord):
+        liberties = self.stringLiberties(fcoord)
+        return liberties != 0 and liberties & (liberties - 1) == 0
+
+    # The last liberty of the string of fcoord if it is in atari, None otherwise
+    def lastLiberty(self, fcoord):
+        liberties = self.stringLiberties(fcoord)
+        if liberties == 0 or liberties & (liberties - 1) != 0:
+            return None
+        return liberties.bit_length() - 1
+
     # Too costly to be used in all the cases
     def breadthSearchStringAndReached(self, fc):
         color = self._board[fc]
@@ -314,6 +509,16 @@ class Board:
                     reached.add(fn)
         return string, reached
 
+    # The stones of the string of fc, read from the circular list of the string
+    def stringStones(self, fc):
+        stones = [fc]
+        stringNext = self._stringNext
+        s = stringNext[fc]
+        while s != fc:
+            stones.append(s)
+            s = stringNext[s]
+        return stones
+
     # Too costly to be used in all the cases
     def breadthSearchString(self, fc):
         color = self._board[fc]
@@ -332,19 +537,96 @@ class Board:
 
     #deprecated: will be removed
     def winner(self):
-        totalWhite = 0
-        totalBlack = 0
-        for m in range(self._BOARDSIZE**2):
-            if self._board[m] == Board._WHITE:
-                totalWhite += 1
-            elif self._board[m] == Board._BLACK:
-                totalBlack += 1
-        if totalWhite > totalBlack:
-            return Board._BLACK
-        if totalWhite < totalBlack:
-            return Board._WHITE
-        return Board._EMPTY
-
+        return {"1-0": Board._WHITE, "0-1": Board._BLACK}.get(self.result(), Board._EMPTY)
+
+    # Area scoring (Tromp-Taylor). The empty points are split in regions
+    # (connected empty points), a region counts for a color when it only reaches
+    # stones of this color. The regions are kept between two calls with the board
+    # they were computed on: only the regions around the points that changed since
+    # are flooded again, whatever was played or popped in between.
+    def _resetRegions(self):
+        self._regionBoard = None # the board of the last update of the regions
+        self._regionOf = [-1] * self._BOARDSIZE**2 # region id of each empty point
+        self._regions = {} # region id -> (points, owner), owner is _EMPTY for the dame
+        self._territory = [0, 0, 0] # number of empty points owned by _EMPTY, _BLACK, _WHITE
+        self._nextRegionId = 0
+
+    def _updateRegions(self):
+        if self._regionBoard is None:
+            changed = range(self._BOARDSIZE**2)
+        else:
+            changed = np.flatnonzero(self._regionBoard != self._board).tolist()
+            if not changed:
+                return
+        cells = self._board.tolist()
+        regionOf = self._regionOf
+        regions = self._regions
+        territory = self._territory
+        neighbors = self._neighbors
+        entries = self._neighborsEntries
+        seeds = []
+        for fcoord in changed:
+            i = entries[fcoord]
+            touched = [fcoord]
+            while neighbors[i] != -1:
+                touched.append(neighbors[i])
+                i += 1
+            for fn in touched:
+                region = regions.pop(regionOf[fn], None)
+                if region is not None:
+                    points, owner = region
+                    territory[owner] -= len(points)
+                    for fc in points:
+                        regionOf[fc] = -1
+                    seeds.extend(points)
+            seeds.append(fcoord)
+        for seed in seeds:
+            if regionOf[seed] != -1 or cells[seed] != Board._EMPTY:
+                continue
+            regionId = self._nextRegionId
+            self._nextRegionId += 1
+            regionOf[seed] = regionId
+            points = [seed]
+            reached = 0 # bit 1 for black stones, bit 2 for white stones
+            k = 0
+            while k < len(points):
+                i = entries[points[k]]
+                k += 1
+                while neighbors[i] != -1:
+                    fn = neighbors[i]
+                    i += 1
+                    c = cells[fn]
+                    if c == Board._EMPTY:
+                        if regionOf[fn] == -1:
+                            regionOf[fn] = regionId
+                            points.append(fn)
+                    else:
+                        reached |= c
+            owner = reached if reached != Board._BLACK | Board._WHITE else Board._EMPTY
+            regions[regionId] = (points, owner)
+            territory[owner] += len(points)
+        for fcoord in changed: # the new stones are in no region
+            if cells[fcoord] != Board._EMPTY:
+                regionOf[fcoord] = -1
+        self._regionBoard = self._board.copy()
+
+    # Area scores of black and white (komi included)
+    def score(self):
+        self._updateRegions()
+        if Board._DEBUG: # Checks the incremental regions against a full computation
+            territory = self._territory[:]
+            self._resetRegions()
+            self._updateRegions()
+            assert territory == self._territory
+        return (self._nbBLACK + self._territory[Board._BLACK],
+                self._nbWHITE + self._territory[Board._WHITE] + self._komi)
+
+    # The color owning each point for the area scoring (_EMPTY for the dame)
+    def areaOwners(self):
+        self._updateRegions()
+        cells = self._board.tolist()
+        return [cells[fcoord] if cells[fcoord] != Board._EMPTY
+                else self._regions[self._regionOf[fcoord]][1] for fcoord in range(self._BOARDSIZE**2)]
 
     def isGameOver(self):
         return  self._gameOver
@@ -352,13 +634,26 @@ class Board:
     def is_game_over(self):
         return self._gameOver
 
+    # Checks that the move on the empty point fcoord is legal for the next player
+    def isLegalMove(self, fcoord):
+        color = self._nextPlayer
+        if self._nbEmptyNeighbors[fcoord] == self._nbNeighbors[fcoord]:
+            # Only empty neighbors: this can't be a suicide nor a capture, only the
+            # new hash has to be checked
+            return self._currentHash ^ self.getPositionHash(fcoord, color) not in self._seenHashes
+        return not self.isSuicide(fcoord, color) and not self.isSuperKo(fcoord, color)[0]
+
+    # Same as legal_moves() but with flat coordinates (-1 is PASS), for the searches
+    # that play them directly with push_fcoord()
+    def legal_fcoords(self):
+        moves = [m for m in self._empties if self.isLegalMove(m)]
+        moves.append(-1) # We can always ask to pass
+        return moves
+
     # Renvoi la liste des coups possibles
-    # Note: cette méthode pourrait être codée plus efficacement
     def legal_moves(self):
-        moves = [Board.coordToName(m) for m in self._empties if not self.isSuicide(m, self._nextPlayer) and not self.isSuperKo(m,
-            self._nextPlayer)[0]]
-        moves.append("PASS") # We can always ask to pass
-        return moves
+        names = self._names
+        return [names[m] for m in self.legal_fcoords()]
 
     # Kept for my own retro-compatibility
     def legalMoves(self):
@@ -380,14 +675,15 @@ class Board:
         toreturn=""
         for i,c in enumerate(self._board):
             toreturn += self._piece2str(c) + " " # +'('+str(i)+":"+str(self._stringUnionFind[i])+","+str(self._stringLiberties[i])+') '
-            if (i+1) % Board._BOARDSIZE == 0:
+            if (i+1) % self._BOARDSIZE == 0:
                 toreturn += "\n"
         toreturn += "Next player: " + ("BLACK" if self._nextPlayer == self._BLACK else "WHITE") + "\n"
         toreturn += str(self._nbBLACK) + " blacks and " + str(self._nbWHITE) + " whites on board\n"
         return toreturn
 
     def prettyPrint(self):
-        if Board._BOARDSIZE not in [5,7,9]:
+        size = self._BOARDSIZE
+        if size < 5:
             print(self)
             return
         print()
@@ -400,21 +696,14 @@ class Board:
         print("     WHITE (O) has %d stones" % self._nbWHITE)
         print("     BLACK (X) has %d stones" % self._nbBLACK)
         print()
-        if Board._BOARDSIZE == 9:
-            specialPoints = [(2,2), (6,2), (4,4), (2,6), (6,6)]
-            headerline = "    A B C D E F G H J"
-        elif Board._BOARDSIZE == 7:
-            specialPoints = [(2,2), (4,2), (3,3), (2,4), (4,4)]
-            headerline = "    A B C D E F G"
-        else:
-            specialPoints = [(1,1), (3,1), (2,2), (1,3), (3,3)]
-            headerline = "    A B C D E"
+        specialPoints = self._tables.specialPoints
+        headerline = "    " + " ".join(self._tables.letters)
         print(headerline)
-        for l in range(Board._BOARDSIZE):
-            line = Board._BOARDSIZE - l
-            print("  %d" % line, end="")
-            for c in range(Board._BOARDSIZE):
-                p = self._board[Board.flatten((l,c))]
+        for l in range(size):
+            line = size - l
+            print("%3d" % line, end="")
+            for c in range(size):
+                p = self._board[l * size + c]
                 ch = '.'
                 if p==Board._WHITE:
                     ch = 'O'
@@ -427,25 +716,22 @@ class Board:
         print(headerline)
         print("hash = ", self._currentHash)
 
-    @staticmethod
-    def moveNameToCoord(s):
+    @sizedStaticMethod
+    def moveNameToCoord(tables, s):
         if s == 'PASS': return -1
-        indexLetters = {'A':0, 'B':1, 'C':2, 'D':3, 'E':4, 'F':5, 'G':6, 'H':7, 'J':8}
+        return divmod(tables.nameToFcoord[s], tables.size)
 
-        col = indexLetters[s[0]]
-        lin = Board._BOARDSIZE - int(s[1:])
-        return (lin, col)
+    @sizedStaticMethod
+    def coordToName(tables, fcoord):
+        return tables.names[fcoord] # names[-1] is 'PASS'
 
-    @staticmethod
-    def coordToName(fcoord):
-        if fcoord == -1: return 'PASS'
-        letterIndex = "ABCDEFGHJ"
-        line = fcoord // Board._BOARDSIZE
-        col = letterIndex[fcoord % Board._BOARDSIZE ]
-        return col+str(Board._BOARDSIZE - line)
+    # Flat coordinate of the move name (-1 for PASS)
+    @sizedStaticMethod
+    def nameToFcoord(tables, s):
+        return tables.nameToFcoord[s]
 
     def captureString(self, fc):
-        string = self.breadthSearchString(fc)
+        string = self.stringStones(fc)
         for s in string:
             if self._nextPlayer == Board._WHITE:
                 self._capturedBLACK += 1
@@ -454,31 +740,40 @@ class Board:
                 self._capturedWHITE += 1
                 self._nbWHITE -= 1
             self._currentHash ^= self.getPositionHash(s, self._board[s])
-            self._board[s] = self._EMPTY
+            self._toggleSymmetryHashes(s, self._board[s])
+            self._write(self._board, s, self._EMPTY)
             self._empties.add(s)
+            bit = 1 << s
             i = self._neighborsEntries[s]
             while self._neighbors[i] != -1:
                 fn = self._neighbors[i]
+                self._write(self._nbEmptyNeighbors, fn, self._nbEmptyNeighbors[fn] + 1)
                 if self._board[fn] != Board._EMPTY:
                     st = self.getStringOfStone(fn)
                     if st != s:
-                        self._stringLiberties[st] += 1
+                        if not self._stringLiberties[st] & bit:
+                            self._write(self._stringLiberties, st, self._stringLiberties[st] | bit)
                 i += 1
-            self._stringUnionFind[s] = -1
-            self._stringSizes[s] = -1
-            self._stringLiberties[s] = -1
+            self._write(self._stringUnionFind, s, -1)
+            self._write(self._stringSizes, s, -1)
+            self._write(self._stringLiberties, s, 0)
 
     def fullPlayMove(self, fcoord):
         if self._gameOver: return
+        if not self._trailMoves: # nothing to undo, no need to keep the log
+            self._trail.clear()
         if fcoord != -1:  # pass otherwise
-            tmpHash = self.isSuperKo(fcoord, self._nextPlayer)[1]
+            if Board._DEBUG:
+                tmpHash = self.isSuperKo(fcoord, self._nextPlayer)[1]
             captured = self.putStone(fcoord, self._nextPlayer)
 
             # captured is the list of Strings that have 0 liberties
             for fc in captured:
                 self.captureString(fc)
 
-            assert tmpHash == self._currentHash
+            if Board._DEBUG:
+                assert tmpHash == self._currentHash
+                assert self._symmetryHashes[0] == self._currentHash
             self._lastPlayerHasPassed = False
             if self._nextPlayer == self._WHITE:
                 self._nbWHITE += 1
@@ -490,32 +785,41 @@ class Board:
             else:
                 self._lastPlayerHasPassed = True
             self._currentHash ^= self._passHash
+            self._symmetryHashes = tuple(h ^ self._passHash for h in self._symmetryHashes)
 
-        self._seenHashes.add(self._currentHash)
-        self._historyMoveNames.append(self.coordToName(fcoord))
+        self._seenHashes[self._currentHash] = self._seenHashes.get(self._currentHash, 0) + 1
+        self._historyMoveNames.append(self._names[fcoord])
         self._nextPlayer = Board.flip(self._nextPlayer)
 
     def playNamedMove(self, m):
-        if m != "PASS":
-            self.fullPlayMove(self.flatten(Board.moveNameToCoord(m)))
-        else:
-            self.fullPlayMove(-1)
+        self.fullPlayMove(self._tables.nameToFcoord[m])
 
     def push(self, m):
         assert not self._gameOver
         self.pushBoard()
         self.playNamedMove(m)
 
+    # Same as push() without the parsing of the move name
+    def push_fcoord(self, fcoord):
+        assert not self._gameOver
+        self.pushBoard()
+        self.fullPlayMove(fcoord)
+
     def pop(self):
         hashtopop = self._currentHash
         self.popBoard()
-        if hashtopop in self._seenHashes:
-            self._seenHashes.remove(hashtopop)
+        count = self._seenHashes.get(hashtopop, 0)
+        if count > 1:
+            self._seenHashes[hashtopop] = count - 1
+        elif count == 1:
+            del self._seenHashes[hashtopop]
 
+    # Result with the area scoring (see score)
     def result(self):
-        if self._nbWHITE > self._nbBLACK:
+        black, white = self.score()
+        if white > black:
             return "1-0"
-        elif self._nbWHITE < self._nbBLACK:
+        elif white < black:
             return "0-1"
         else:
             return "1/2-1/2"
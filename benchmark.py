@@ -0,0 +1,389 @@
+# -*- coding: utf-8 -*-
+
+''' Benchmarks of the Goban engine.
+
+    The suite times the hot paths of Goban.Board on positions taken from random
+    games with fixed seeds: push/pop, legal_moves, creating and copying boards,
+    area scoring, isSuicide, isSuperKo, captureString, whole random games, the
+    playouts of playoutPolicy and the alpha-beta search of myPlayer at a fixed
+    depth. The results can be saved as JSON and compared with a baseline
+    saved by a previous run: a benchmark slower than the baseline by more than
+    the tolerance is reported as a regression (and the exit status is 1).
+
+    Usage:
+      python benchmark.py -o baseline.json
+      python benchmark.py -b baseline.json [-o results.json] [--tolerance 0.2]
+      python benchmark.py --undo-log 3 4 --backends
+
+    --undo-log compares the undo log used by Board.push/pop with the previous
+    approach, that copied the whole board status on each push, and --backends
+    the speed of random games on the array and bitboard backends.
+'''
+
+import gc
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import Goban
+
+class SnapshotBoard(Goban.Board):
+    ''' The board as it was before the undo log: each push copies everything '''
+
+    def pushBoard(self):
+        self._trail.clear() # the undo log is not used here
+        currentStatus = []
+        currentStatus.append(self._nbWHITE)
+        currentStatus.append(self._nbBLACK)
+        currentStatus.append(self._capturedWHITE)
+        currentStatus.append(self._capturedBLACK)
+        currentStatus.append(self._nextPlayer)
+        currentStatus.append(self._board.copy())
+        currentStatus.append(self._gameOver)
+        currentStatus.append(self._lastPlayerHasPassed)
+        currentStatus.append(self._stringUnionFind.copy())
+        currentStatus.append(self._stringLiberties.copy())
+        currentStatus.append(self._stringSizes.copy())
+        currentStatus.append(self._stringNext.copy())
+        currentStatus.append(self._empties.copy())
+        currentStatus.append(self._nbEmptyNeighbors.copy())
+        currentStatus.append(self._currentHash)
+        currentStatus.append(self._symmetryHashes)
+        self._trailMoves.append(currentStatus)
+
+    def popBoard(self):
+        oldStatus = self._trailMoves.pop()
+        self._symmetryHashes = oldStatus.pop()
+        self._currentHash = oldStatus.pop()
+        self._nbEmptyNeighbors = oldStatus.pop()
+        self._empties = oldStatus.pop()
+        self._stringNext = oldStatus.pop()
+        self._stringSizes = oldStatus.pop()
+        self._stringLiberties = oldStatus.pop()
+        self._stringUnionFind = oldStatus.pop()
+        self._lastPlayerHasPassed = oldStatus.pop()
+        self._gameOver = oldStatus.pop()
+        self._board = oldStatus.pop()
+        self._nextPlayer = oldStatus.pop()
+        self._capturedBLACK = oldStatus.pop()
+        self._capturedWHITE = oldStatus.pop()
+        self._nbBLACK = oldStatus.pop()
+        self._nbWHITE = oldStatus.pop()
+        self._historyMoveNames.pop()
+
+# Plays the same random opening on the given board (the tree needs a position
+# with few empties to reach depth 3-4 in a reasonable time)
+def randomOpening(board, nbMoves, seed=0):
+    rng = random.Random(seed)
+    for _ in range(nbMoves):
+        moves = sorted(m for m in board.legal_moves() if m != "PASS")
+        if not moves:
+            break
+        board.playNamedMove(rng.choice(moves))
+    return board
+
+# Walks the whole tree of legal moves (in a fixed order, so that both boards visit
+# the same nodes) and returns the number of visited nodes
+def perft(board, depth):
+    if depth == 0 or board.is_game_over():
+        return 1
+    nodes = 1
+    for m in sorted(board.legal_moves()):
+        board.push(m)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+def timePerft(boardClass, depth, nbOpeningMoves):
+    board = randomOpening(boardClass(), nbOpeningMoves)
+    start = time.perf_counter()
+    nodes = perft(board, depth)
+    return time.perf_counter() - start, nodes
+
+# Average time of a push/pop pair over all the legal moves of the position
+def timePushPop(boardClass, nbOpeningMoves, repeat=200):
+    board = randomOpening(boardClass(), nbOpeningMoves)
+    moves = sorted(board.legal_moves())
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for m in moves:
+            board.push(m)
+            board.pop()
+    return (time.perf_counter() - start) / (repeat * len(moves))
+
+def benchPushPop(depths, nbOpeningMoves=70):
+    snapshot = timePushPop(SnapshotBoard, nbOpeningMoves)
+    trail = timePushPop(Goban.Board, nbOpeningMoves)
+    print("push/pop: snapshot %.1fus, undo log %.1fus (x%.2f)" % (snapshot * 1e6, trail * 1e6,
+        snapshot / trail))
+    for depth in depths:
+        snapshot = timePerft(SnapshotBoard, depth, nbOpeningMoves)
+        trail = timePerft(Goban.Board, depth, nbOpeningMoves)
+        assert snapshot[1] == trail[1], "Both boards must visit the same tree"
+        print("depth %d, %d nodes: snapshot %.3fs, undo log %.3fs (x%.2f)" % (depth, trail[1],
+            snapshot[0], trail[0], snapshot[0] / trail[0]))
+
+# Random game until the end (or maxMoves), PASS is only played when nothing else is legal
+def randomGame(board, rng, maxMoves=300):
+    nbMoves = 0
+    while not board.is_game_over() and nbMoves < maxMoves:
+        moves = board.legal_fcoords()
+        board.push_fcoord(rng.choice(moves[:-1]) if len(moves) > 1 else -1)
+        nbMoves += 1
+    return nbMoves
+
+def benchBackends(nbGames=20):
+    for backend in ["array", "bitboard"]:
+        rng = random.Random(0)
+        start = time.perf_counter()
+        nbMoves = sum(randomGame(Goban.Board(backend=backend), rng) for _ in range(nbGames))
+        elapsed = time.perf_counter() - start
+        print("%s backend: %.1f games/s, %.0f moves/s" % (backend, nbGames / elapsed,
+            nbMoves / elapsed))
+
+
+# The positions of the suite: the boards after nbMoves random moves of a few
+# seeded games (the same positions from one run to the next)
+def suitePositions(seeds=(1, 2, 3, 4), moveNumbers=(10, 30, 50, 70, 90, 110)):
+    positions = []
+    for seed in seeds:
+        rng = random.Random(seed)
+        board = Goban.Board()
+        for nbMoves in range(max(moveNumbers) + 1):
+            if board.is_game_over():
+                break
+            if nbMoves in moveNumbers:
+                positions.append(list(board._historyMoveNames))
+            moves = sorted(board.legal_fcoords()) # not in the order of the set of empties
+            board.push_fcoord(rng.choice(moves[1:]) if len(moves) > 1 else -1)
+    return positions
+
+def replay(history, board=None):
+    board = board or Goban.Board()
+    for m in history:
+        board.playNamedMove(m)
+    return board
+
+# Best time of repeat runs of number times run(board) over all the positions
+# (the garbage collector is stopped during the runs). run returns the number of
+# operations.
+def timeOnPositions(positions, run, repeat, number=1):
+    boards = [replay(history) for history in positions]
+    best = None
+    for _ in range(repeat):
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            nbOps = sum(run(board) for _ in range(number) for board in boards)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, nbOps
+
+def _pushPopAll(board):
+    moves = board.legal_fcoords()
+    for m in moves:
+        board.push_fcoord(m)
+        board.pop()
+    return len(moves)
+
+def _newBoard(board):
+    Goban.Board()
+    return 1
+
+def _copyBoard(board):
+    board.copy(withUndo=False)
+    return 1
+
+def _legalMoves(board):
+    board.legal_moves()
+    return 1
+
+# Area score after each legal move: the regions are updated from the previous
+# position each time
+def _scoreAll(board):
+    moves = board.legal_fcoords()
+    for m in moves:
+        board.push_fcoord(m)
+        board.score()
+        board.pop()
+    return len(moves)
+
+def _isSuicideAll(board):
+    color = board._nextPlayer
+    empties = sorted(board._empties)
+    for fcoord in empties:
+        board.isSuicide(fcoord, color)
+    return len(empties)
+
+def _isSuperKoAll(board):
+    color = board._nextPlayer
+    empties = [fcoord for fcoord in sorted(board._empties) if not board.isSuicide(fcoord, color)]
+    for fcoord in empties:
+        board.isSuperKo(fcoord, color)
+    return len(empties)
+
+# Only captureString is timed: the capturing stone is put with putStone and the
+# whole move is undone with popBoard
+def _captureStrings(board):
+    elapsed = 0.0
+    nbCaptures = 0
+    for fcoord in board.legal_fcoords()[:-1]:
+        board.pushBoard()
+        captured = board.putStone(fcoord, board._nextPlayer)
+        start = time.perf_counter()
+        for fc in captured:
+            board.captureString(fc)
+        elapsed += time.perf_counter() - start
+        nbCaptures += len(captured)
+        board._historyMoveNames.append(board.coordToName(fcoord)) # popped by popBoard
+        board.popBoard()
+    _captureStrings.elapsed += elapsed
+    return nbCaptures
+_captureStrings.elapsed = 0.0
+
+def benchCaptureString(positions, repeat, number):
+    best = None
+    for _ in range(repeat):
+        _captureStrings.elapsed = 0.0
+        _, nbOps = timeOnPositions(positions, _captureStrings, 1, number)
+        best = _captureStrings.elapsed if best is None else min(best, _captureStrings.elapsed)
+    return best, nbOps
+
+def benchPlayouts(nbGames, repeat, seed=0):
+    best = None
+    for _ in range(repeat):
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        nbMoves = sum(randomGame(Goban.Board(), rng) for _ in range(nbGames))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, nbMoves
+
+# Games of the playout policy of the Monte Carlo players (returns the number of
+# games: their length depends on the policy)
+def benchPolicyPlayouts(nbGames, repeat, seed=0):
+    import playoutPolicy
+    best = None
+    for _ in range(repeat):
+        policy = playoutPolicy.PlayoutPolicy(random.Random(seed))
+        start = time.perf_counter()
+        for _ in range(nbGames):
+            policy.playout(Goban.Board(), 3 * Goban.Board._BOARDSIZE**2)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, nbGames
+
+# Fixed depth alpha-beta search of myPlayer (no time limit) from each position,
+# with an empty transposition table and move ordering history for each one
+def benchAlphaBeta(positions, depth, repeat):
+    import myPlayer
+    best = None
+    for _ in range(repeat):
+        player = myPlayer.myPlayer()
+        elapsed = 0.0
+        nbNodes = 0
+        for history in positions:
+            player._board = replay(history)
+            player.newGame(player._board._nextPlayer)
+            player._tt.clear()
+            player._ordering.clear()
+            player.resetStats()
+            start = time.perf_counter()
+            player.MaxMinCoupAB(depth)
+            elapsed += time.perf_counter() - start
+            nbNodes += player._stats["nodes"]
+        best = elapsed if best is None else min(best, elapsed)
+    return best, nbNodes
+
+# Each result is a rate (operations per second, higher is better) with the
+# number of operations it was measured on
+def runSuite(repeat=3, depth=2, nbGames=10):
+    positions = suitePositions()
+    timings = {
+        "pushPop": timeOnPositions(positions, _pushPopAll, repeat, 20),
+        "legalMoves": timeOnPositions(positions, _legalMoves, repeat, 200),
+        "newBoard": timeOnPositions(positions, _newBoard, repeat, 1000),
+        "copyBoard": timeOnPositions(positions, _copyBoard, repeat, 1000),
+        "areaScore": timeOnPositions(positions, _scoreAll, repeat, 10),
+        "isSuicide": timeOnPositions(positions, _isSuicideAll, repeat, 200),
+        "isSuperKo": timeOnPositions(positions, _isSuperKoAll, repeat, 50),
+        "captureString": benchCaptureString(positions, repeat, 50),
+        "playoutGames": benchPlayouts(nbGames, repeat),
+        "policyPlayouts": benchPolicyPlayouts(10 * nbGames, repeat),
+        "alphaBetaNodes": benchAlphaBeta(positions, depth, repeat),
+    }
+    results = {}
+    for name, (elapsed, nbOps) in timings.items():
+        results[name] = {"opsPerSecond": nbOps / elapsed, "ops": nbOps, "seconds": elapsed}
+    games = results["playoutGames"]
+    results["playoutMoves"] = dict(games)
+    results["playoutGames"] = {"opsPerSecond": nbGames / games["seconds"], "ops": nbGames,
+        "seconds": games["seconds"]}
+    return {"machine": {"python": platform.python_version(), "platform": platform.platform()},
+            "settings": {"repeat": repeat, "depth": depth, "games": nbGames},
+            "benchmarks": results}
+
+# Lists the benchmarks whose rate is lower than the baseline rate by more than
+# tolerance. A different number of operations means that the engine does not
+# do the same work anymore (not a speed regression, but worth a look)
+def compareWithBaseline(results, baseline, tolerance=0.2):
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            print("%-15s %12.0f ops/s (not in the baseline)" % (name, current["opsPerSecond"]))
+            continue
+        ratio = current["opsPerSecond"] / previous["opsPerSecond"]
+        status = "ok"
+        if ratio < 1.0 - tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        if current["ops"] != previous["ops"]:
+            status += " (%d ops instead of %d)" % (current["ops"], previous["ops"])
+        print("%-15s %12.0f ops/s, baseline %12.0f (x%.2f) %s" % (name, current["opsPerSecond"],
+            previous["opsPerSecond"], ratio, status))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the Goban engine")
+    parser.add_argument("-o", "--output", help="saves the results to this JSON file")
+    parser.add_argument("-b", "--baseline", help="compares the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown (fraction)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark (best kept)")
+    parser.add_argument("--depth", type=int, default=2, help="depth of the alpha-beta searches")
+    parser.add_argument("--games", type=int, default=10, help="number of random games")
+    parser.add_argument("--undo-log", type=int, nargs="*", metavar="DEPTH",
+        help="compares the undo log with copying push/pop instead of running the suite")
+    parser.add_argument("--backends", action="store_true",
+        help="compares the board backends instead of running the suite")
+    args = parser.parse_args(argv)
+
+    if args.undo_log is not None or args.backends:
+        if args.undo_log is not None:
+            benchPushPop(args.undo_log or [3, 4])
+        if args.backends:
+            benchBackends()
+        return 0
+
+    results = runSuite(args.repeat, args.depth, args.games)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compareWithBaseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions:", ", ".join(regressions))
+            return 1
+    else:
+        for name, r in results["benchmarks"].items():
+            print("%-15s %12.0f ops/s (%d ops in %.3fs)" % (name, r["opsPerSecond"], r["ops"], r["seconds"]))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
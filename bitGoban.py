@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+
+''' Bitboard backend for Goban.Board, selected with Goban.Board(backend="bitboard").
+
+    Black and white stones are stored as two Python integers, the bit fcoord being
+    set when there is a stone on fcoord. Strings, liberties and captures are
+    computed with shifts and masks instead of reading the cells one by one.
+    The class exposes the same public API as Goban.Board (push, pop, legal_moves,
+    legal_fcoords, result, is_game_over, ...) and the same flat coordinates.
+
+    Superko is checked on the exact position (both bitboards and the parity of the
+    passes, which is what the Zobrist hash of Goban.Board encodes).
+'''
+
+from __future__ import print_function
+from collections import Counter
+import numpy as np
+import Goban
+
+_bitTables = {}
+
+# The masks of the board size: all the points, the points not on the first column,
+# not on the last column, and the neighbors of each point. Built once per size.
+def bitTables(size):
+    if size not in _bitTables:
+        full = (1 << size**2) - 1
+        notFirstColumn = 0
+        notLastColumn = 0
+        for fcoord in range(size**2):
+            if fcoord % size != 0:
+                notFirstColumn |= 1 << fcoord
+            if fcoord % size != size - 1:
+                notLastColumn |= 1 << fcoord
+        neighborMasks = []
+        for fcoord in range(size**2):
+            bb = 1 << fcoord
+            neighborMasks.append((((bb << 1) & notFirstColumn) | ((bb >> 1) & notLastColumn)
+                | (bb << size) | (bb >> size)) & full)
+        _bitTables[size] = (full, notFirstColumn, notLastColumn, tuple(neighborMasks))
+    return _bitTables[size]
+
+class BitBoard:
+    _BLACK = Goban.Board._BLACK
+    _WHITE = Goban.Board._WHITE
+    _EMPTY = Goban.Board._EMPTY
+    _BOARDSIZE = Goban.Board._BOARDSIZE
+
+    # Same coordinates as Goban.Board (they use the size of the board, see
+    # Goban.sizedStaticMethod)
+    flatten = Goban.Board.__dict__["flatten"]
+    unflatten = Goban.Board.__dict__["unflatten"]
+    moveNameToCoord = Goban.Board.__dict__["moveNameToCoord"]
+    coordToName = Goban.Board.__dict__["coordToName"]
+    nameToFcoord = Goban.Board.__dict__["nameToFcoord"]
+    flip = staticmethod(Goban.Board.flip)
+    playerName = staticmethod(Goban.Board.playerName)
+
+    def __init__(self, size=None, komi=None):
+        tables = Goban.boardTables(size or Goban.Board._BOARDSIZE)
+        self._tables = tables
+        self._BOARDSIZE = tables.size
+        self._komi = Goban.Board._KOMI if komi is None else komi
+        self._names = tables.names
+        (self._full, self._notFirstColumn, self._notLastColumn,
+            self._neighborMasks) = bitTables(tables.size)
+
+        self._stones = [0, 0, 0] # indexed by color, _stones[_EMPTY] is unused
+        self._nbWHITE = 0
+        self._nbBLACK = 0
+        self._capturedWHITE = 0
+        self._capturedBLACK = 0
+        self._nextPlayer = self._BLACK
+        self._lastPlayerHasPassed = False
+        self._gameOver = False
+        self._passParity = 0
+        self._seenPositions = Counter()
+        self._historyMoveNames = []
+        self._trailMoves = []
+
+    def reset(self):
+        self.__init__(self._BOARDSIZE, self._komi)
+
+    # The status is made of integers and tuples: only the containers are copied
+    # (see Goban.Board.copy)
+    def copy(self, withUndo=True):
+        other = object.__new__(BitBoard)
+        other.__dict__.update(self.__dict__)
+        other._stones = self._stones[:]
+        other._seenPositions = Counter(self._seenPositions)
+        other._historyMoveNames = self._historyMoveNames[:]
+        other._trailMoves = self._trailMoves[:] if withUndo else []
+        return other
+
+    clone = copy
+
+    # All the points at distance 1 of the stones of bb
+    def neighborsOf(self, bb):
+        size = self._BOARDSIZE
+        return (((bb << 1) & self._notFirstColumn) | ((bb >> 1) & self._notLastColumn)
+                | (bb << size) | (bb >> size)) & self._full
+
+    def empties(self):
+        return self._full & ~(self._stones[self._BLACK] | self._stones[self._WHITE])
+
+    # The string of stones (of the same color) containing the stones in seed
+    def floodString(self, seed, stones):
+        string = seed
+        while True:
+            grown = (string | self.neighborsOf(string)) & stones
+            if grown == string:
+                return string
+            string = grown
+
+    def liberties(self, string):
+        return self.neighborsOf(string) & self.empties()
+
+    def _positionKey(self):
+        return (self._stones[self._BLACK], self._stones[self._WHITE], self._passParity)
+
+    # Returns the opponent stones captured by a move of color on fcoord, and the
+    # liberties left to the string of the move
+    def _moveEffect(self, fcoord, color):
+        bit = 1 << fcoord
+        own = self._stones[color] | bit
+        opponent = self._stones[Goban.Board.flip(color)]
+        empties = self.empties() & ~bit
+        captured = 0
+        around = self._neighborMasks[fcoord] & opponent
+        while around:
+            stone = around & -around
+            string = self.floodString(stone, opponent)
+            around &= ~string
+            if self.neighborsOf(string) & empties == 0:
+                captured |= string
+        empties |= captured
+        ownLiberties = self.neighborsOf(self.floodString(bit, own)) & empties
+        return captured, ownLiberties
+
+    def isSuicide(self, fcoord, color):
+        if self._neighborMasks[fcoord] & self.empties():
+            return False
+        captured, ownLiberties = self._moveEffect(fcoord, color)
+        return captured == 0 and ownLiberties == 0
+
+    def isSuperKo(self, fcoord, color):
+        captured, _ = self._moveEffect(fcoord, color)
+        stones = list(self._stones)
+        stones[color] |= 1 << fcoord
+        stones[Goban.Board.flip(color)] &= ~captured
+        key = (stones[self._BLACK], stones[self._WHITE], self._passParity)
+        return key in self._seenPositions, key
+
+    def isLegalMove(self, fcoord):
+        color = self._nextPlayer
+        neighbors = self._neighborMasks[fcoord]
+        if neighbors & self._stones[Goban.Board.flip(color)]:
+            return not self.isSuicide(fcoord, color) and not self.isSuperKo(fcoord, color)[0]
+        # No opponent stone around: the move captures nothing
+        bit = 1 << fcoord
+        stones = list(self._stones)
+        stones[color] |= bit
+        if not neighbors & self.empties():
+            string = self.floodString(bit, stones[color])
+            if not self.liberties(string) & ~bit:
+                return False
+        return (stones[self._BLACK], stones[self._WHITE], self._passParity) not in self._seenPositions
+
+    # Maps the last liberty of each string in atari to the stones of these strings
+    def _stringsInAtari(self, stones):
+        ataris = {}
+        empties = self.empties()
+        while stones:
+            string = self.floodString(stones & -stones, stones)
+            stones &= ~string
+            liberties = self.neighborsOf(string) & empties
+            if liberties and liberties & (liberties - 1) == 0: # exactly one liberty
+                fcoord = liberties.bit_length() - 1
+                ataris[fcoord] = ataris.get(fcoord, 0) | string
+        return ataris
+
+    # Each string is flooded once, instead of once per neighbor point as
+    # isLegalMove would do
+    def legal_fcoords(self):
+        color = self._nextPlayer
+        opponent = Goban.Board.flip(color)
+        own = self._stones[color]
+        other = self._stones[opponent]
+        empties = self.empties()
+        captures = self._stringsInAtari(other)
+        ownAtaris = self._stringsInAtari(own)
+        moves = []
+        remaining = empties
+        while remaining:
+            bit = remaining & -remaining
+            remaining ^= bit
+            fcoord = bit.bit_length() - 1
+            captured = captures.get(fcoord, 0)
+            if not captured and not self._neighborMasks[fcoord] & empties:
+                # No liberty around: legal only if an own string around keeps a liberty
+                if not self._neighborMasks[fcoord] & own & ~ownAtaris.get(fcoord, 0):
+                    continue
+            stones = [0, 0, 0]
+            stones[color] = own | bit
+            stones[opponent] = other & ~captured
+            if (stones[self._BLACK], stones[self._WHITE], self._passParity) not in self._seenPositions:
+                moves.append(fcoord)
+        moves.append(-1) # We can always ask to pass
+        return moves
+
+    def legal_moves(self):
+        names = self._names
+        return [names[m] for m in self.legal_fcoords()]
+
+    def legalMoves(self):
+        return self.legal_moves()
+
+    def generate_legal_moves(self):
+        return self.legalMoves()
+
+    def fullPlayMove(self, fcoord):
+        if self._gameOver: return
+        color = self._nextPlayer
+        if fcoord != -1:  # pass otherwise
+            opponent = Goban.Board.flip(color)
+            captured, _ = self._moveEffect(fcoord, color)
+            self._stones[color] |= 1 << fcoord
+            self._stones[opponent] &= ~captured
+            nbCaptured = bin(captured).count("1")
+            if color == self._WHITE:
+                self._nbWHITE += 1
+                self._nbBLACK -= nbCaptured
+                self._capturedBLACK += nbCaptured
+            else:
+                self._nbBLACK += 1
+                self._nbWHITE -= nbCaptured
+                self._capturedWHITE += nbCaptured
+            self._lastPlayerHasPassed = False
+        else:
+            if self._lastPlayerHasPassed:
+                self._gameOver = True
+            else:
+                self._lastPlayerHasPassed = True
+            self._passParity ^= 1
+
+        self._seenPositions[self._positionKey()] += 1
+        self._historyMoveNames.append(self._names[fcoord])
+        self._nextPlayer = Goban.Board.flip(self._nextPlayer)
+
+    def playNamedMove(self, m):
+        self.fullPlayMove(self._tables.nameToFcoord[m])
+
+    # The whole status is made of integers, so saving it is cheap
+    def pushBoard(self):
+        self._trailMoves.append((tuple(self._stones), self._nbWHITE, self._nbBLACK,
+            self._capturedWHITE, self._capturedBLACK, self._nextPlayer, self._gameOver,
+            self._lastPlayerHasPassed, self._passParity))
+
+    def popBoard(self):
+        key = self._positionKey()
+        self._seenPositions[key] -= 1
+        if self._seenPositions[key] == 0:
+            del self._seenPositions[key]
+        (stones, self._nbWHITE, self._nbBLACK, self._capturedWHITE, self._capturedBLACK,
+            self._nextPlayer, self._gameOver, self._lastPlayerHasPassed,
+            self._passParity) = self._trailMoves.pop()
+        self._stones = list(stones)
+        self._historyMoveNames.pop()
+
+    def push(self, m):
+        assert not self._gameOver
+        self.pushBoard()
+        self.playNamedMove(m)
+
+    def push_fcoord(self, fcoord):
+        assert not self._gameOver
+        self.pushBoard()
+        self.fullPlayMove(fcoord)
+
+    def pop(self):
+        self.popBoard()
+
+    def isGameOver(self):
+        return self._gameOver
+
+    def is_game_over(self):
+        return self._gameOver
+
+    # The regions of empty points reaching only one color, as one bitboard per
+    # color (index _BLACK and _WHITE, see Goban.Board.score). Each region is
+    # flooded at once, which is cheap enough to do it from scratch.
+    def _territories(self):
+        territories = [0, 0, 0]
+        empties = self.empties()
+        remaining = empties
+        while remaining:
+            region = self.floodString(remaining & -remaining, empties)
+            remaining &= ~region
+            around = self.neighborsOf(region)
+            reachesBlack = around & self._stones[self._BLACK] != 0
+            reachesWhite = around & self._stones[self._WHITE] != 0
+            if reachesBlack != reachesWhite:
+                territories[self._BLACK if reachesBlack else self._WHITE] |= region
+        return territories
+
+    def score(self):
+        territories = self._territories()
+        return (self._nbBLACK + bin(territories[self._BLACK]).count("1"),
+                self._nbWHITE + bin(territories[self._WHITE]).count("1") + self._komi)
+
+    def areaOwners(self):
+        territories = self._territories()
+        owners = []
+        for fcoord in range(self._BOARDSIZE**2):
+            bit = 1 << fcoord
+            for color in (self._BLACK, self._WHITE):
+                if (self._stones[color] | territories[color]) & bit:
+                    owners.append(color)
+                    break
+            else:
+                owners.append(self._EMPTY)
+        return owners
+
+    def result(self):
+        black, white = self.score()
+        if white > black:
+            return "1-0"
+        elif white < black:
+            return "0-1"
+        else:
+            return "1/2-1/2"
+
+    # The board as the int8 array used by Goban.Board (for the evaluations that
+    # read the cells)
+    @property
+    def _board(self):
+        board = np.zeros((self._BOARDSIZE**2), dtype='int8')
+        for color in (self._BLACK, self._WHITE):
+            stones = self._stones[color]
+            while stones:
+                bit = stones & -stones
+                stones ^= bit
+                board[bit.bit_length() - 1] = color
+        return board
+
+    # Only used for printing the board
+    @property
+    def _currentHash(self):
+        return hash(self._positionKey())
+
+    _piece2str = Goban.Board._piece2str
+    __str__ = Goban.Board.__str__
+    prettyPrint = Goban.Board.prettyPrint
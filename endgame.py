@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+''' Early detection of the end of the games.
+
+    The strings that can not be captured, even if their owner always passes, are
+    found with Benson's algorithm (unconditional life): a string is alive when it
+    has at least two vital regions, a region (connected points that are not of
+    the color) being vital to a string when all its empty points are liberties
+    of the string, and only bordered by living strings. The vital regions of the
+    living strings are the pass-alive territory of the color: the opponent can
+    not live there, and filling them only removes eyes.
+
+    A position is settled when every point is a living stone, an empty point of
+    a pass-alive territory, or a dame: an empty point next to a living string, in
+    a region of such points that reaches both colors. The only meaningful moves
+    left are then the dame, and the result is known (the dame count for nobody,
+    they are shared when they are filled in turn). Dead stones left in a
+    territory count for their color in the area score (Goban.Board.score): the
+    position is not settled until the owner of the territory has captured them.
+
+    Works with both backends (it only reads board._board).
+'''
+
+import Goban
+
+# Two eyes need room: the positions with less than half of the points played
+# are not worth checking
+def canBeSettled(board):
+    return 2 * (board._nbBLACK + board._nbWHITE) >= board._BOARDSIZE**2
+
+# Returns the points of the strings of color that are unconditionally alive and
+# the points of their vital regions
+def passAlive(board, color):
+    cells = board._board.tolist()
+    tables = Goban.boardTables(board._BOARDSIZE)
+    neighbors = tables.neighbors
+    entries = tables.neighborsEntries
+    nbPoints = tables.nbPoints
+
+    # Strings of color and regions of the other points, as lists of points
+    groupOf = [-1] * nbPoints
+    strings = []
+    regions = []
+    for fcoord in range(nbPoints):
+        if groupOf[fcoord] != -1:
+            continue
+        isString = cells[fcoord] == color
+        groups = strings if isString else regions
+        groupOf[fcoord] = len(groups)
+        points = [fcoord]
+        k = 0
+        while k < len(points):
+            i = entries[points[k]]
+            k += 1
+            while neighbors[i] != -1:
+                fn = neighbors[i]
+                i += 1
+                if groupOf[fn] == -1 and (cells[fn] == color) == isString:
+                    groupOf[fn] = len(groups)
+                    points.append(fn)
+        groups.append(points)
+
+    # Strings around each region, and strings to which the region is vital: the
+    # ones next to all its empty points
+    bordering = []
+    vitalTo = []
+    for points in regions:
+        around = set()
+        vital = None
+        for fcoord in points:
+            adjacent = set()
+            i = entries[fcoord]
+            while neighbors[i] != -1:
+                fn = neighbors[i]
+                i += 1
+                if cells[fn] == color:
+                    adjacent.add(groupOf[fn])
+            around |= adjacent
+            if cells[fcoord] == Goban.Board._EMPTY:
+                vital = adjacent if vital is None else vital & adjacent
+        bordering.append(around)
+        vitalTo.append(around if vital is None else vital)
+    vitalRegions = [[] for _ in strings]
+    for r, vital in enumerate(vitalTo):
+        for s in vital:
+            vitalRegions[s].append(r)
+
+    # Benson: removes the strings with less than two healthy regions, and the
+    # regions next to a removed string, until nothing changes
+    alive = set(range(len(strings)))
+    healthy = set(range(len(regions)))
+    while True:
+        healthy = set(r for r in healthy if bordering[r] <= alive)
+        stillAlive = set(s for s in alive if sum(1 for r in vitalRegions[s] if r in healthy) >= 2)
+        if stillAlive == alive:
+            break
+        alive = stillAlive
+
+    alivePoints = [fcoord for s in alive for fcoord in strings[s]]
+    territory = [fcoord for r in healthy if vitalTo[r] & alive for fcoord in regions[r]]
+    return alivePoints, territory
+
+# The color owning each point for sure (living stones and pass-alive territory),
+# _EMPTY for the other points
+def settledAreas(board):
+    owners = [Goban.Board._EMPTY] * board._BOARDSIZE**2
+    for color in (Goban.Board._BLACK, Goban.Board._WHITE):
+        alivePoints, territory = passAlive(board, color)
+        for fcoord in alivePoints:
+            owners[fcoord] = color
+        for fcoord in territory:
+            owners[fcoord] = color
+    return owners
+
+# Whether all the points that are not owned for sure are dame (see the module
+# documentation)
+def _onlyDame(board, owners):
+    cells = board._board.tolist()
+    tables = Goban.boardTables(board._BOARDSIZE)
+    neighbors = tables.neighbors
+    entries = tables.neighborsEntries
+    unsettled = [fcoord for fcoord, owner in enumerate(owners) if owner == Goban.Board._EMPTY]
+    allDame = True
+    seen = set()
+    for start in unsettled:
+        if not allDame:
+            break
+        if start in seen:
+            continue
+        seen.add(start)
+        region = [start]
+        reached = 0
+        k = 0
+        while k < len(region):
+            fcoord = region[k]
+            k += 1
+            if cells[fcoord] != Goban.Board._EMPTY:
+                allDame = False # a stone that is not alive
+                break
+            nextToAlive = False
+            i = entries[fcoord]
+            while neighbors[i] != -1:
+                fn = neighbors[i]
+                i += 1
+                if owners[fn] == Goban.Board._EMPTY:
+                    if fn not in seen:
+                        seen.add(fn)
+                        region.append(fn)
+                elif cells[fn] == owners[fn]: # a living stone
+                    reached |= owners[fn]
+                    nextToAlive = True
+            if not nextToAlive:
+                allDame = False # an open area, not a dame
+                break
+        if reached != Goban.Board._BLACK | Goban.Board._WHITE:
+            allDame = False
+    return allDame
+
+# Whether no stone is left in the territories of the other color
+def _noDeadStones(board, owners):
+    cells = board._board.tolist()
+    return all(cell == Goban.Board._EMPTY or cell == owner
+        for cell, owner in zip(cells, owners) if owner != Goban.Board._EMPTY)
+
+def _settled(board, owners):
+    return _noDeadStones(board, owners) and _onlyDame(board, owners)
+
+def isSettled(board):
+    return _settled(board, settledAreas(board))
+
+# The legal moves that can still change something: all the legal moves but the
+# ones in pass-alive territories, except the moves of the owner of a territory
+# next to opponent stones left in it (they are captured this way). In a settled
+# position, only the dame are left. PASS is always in the list.
+def meaningfulMoves(board):
+    owners = settledAreas(board)
+    cells = board._board.tolist()
+    color = board._nextPlayer
+    opponent = Goban.Board.flip(color)
+    tables = Goban.boardTables(board._BOARDSIZE)
+    neighbors = tables.neighbors
+    entries = tables.neighborsEntries
+    def nextToOpponent(fcoord):
+        i = entries[fcoord]
+        while neighbors[i] != -1:
+            if cells[neighbors[i]] == opponent:
+                return True
+            i += 1
+        return False
+    return [m for m in board.legal_fcoords() if m == -1 or owners[m] == Goban.Board._EMPTY
+        or (owners[m] == color and nextToOpponent(m))]
+
+# Area scores (black, white with the komi) of a settled position, None if the
+# position is not settled (the same as Goban.Board.score() then)
+def settledScore(board):
+    owners = settledAreas(board)
+    if not _settled(board, owners):
+        return None
+    return (owners.count(Goban.Board._BLACK), owners.count(Goban.Board._WHITE) + board._komi)
+
+# Same as board.result() for a settled position, None if it is not settled
+def settledResult(board):
+    score = settledScore(board)
+    if score is None:
+        return None
+    black, white = score
+    if white > black:
+        return "1-0"
+    if white < black:
+        return "0-1"
+    return "1/2-1/2"
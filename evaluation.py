@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+''' Vectorized evaluation of leaf positions.
+
+    The positions are given as a stacked int8 array, one row per position (the
+    cells of Goban.Board._board), and all of them are scored with a few NumPy
+    calls instead of a Python loop over the points of each board. The features,
+    from the point of view of color, are:
+     - stones: own stones minus opponent stones,
+     - area: stones plus the empty points touching only own stones, minus the
+       same for the opponent (a one step estimate of the territories),
+     - liberties: empty points touching own stones minus empty points touching
+       opponent stones (the liberties of all the strings of each color).
+
+    The searches gather the boards of the frontier (all the children of a node at
+    depth 1) and evaluate them in one call, see myPlayer._leafValues.
+'''
+
+import numpy as np
+import Goban
+
+FEATURES = ("stones", "area", "liberties")
+DEFAULT_WEIGHTS = {"stones": 1, "area": 0, "liberties": 0} # the stone count of computeScore
+
+_OFFBOARD = 3 # value of the padding cell, neither a color nor empty
+
+class BatchEvaluator:
+
+    def __init__(self, size=Goban.Board._BOARDSIZE, weights=None):
+        tables = Goban.boardTables(size)
+        self._nbPoints = tables.nbPoints
+        # The 4 neighbors of each point, missing ones pointing to the padding cell
+        # added after the last point
+        self._neighbors = np.full((tables.nbPoints, 4), tables.nbPoints, dtype=np.intp)
+        for fcoord in range(tables.nbPoints):
+            neighbors = tables.pointNeighbors(fcoord)
+            self._neighbors[fcoord, :len(neighbors)] = neighbors
+        self._weights = dict(DEFAULT_WEIGHTS)
+        self._weights.update(weights or {})
+        unknown = set(self._weights) - set(FEATURES)
+        if unknown:
+            raise ValueError("Unknown evaluation features: %s" % ", ".join(sorted(unknown)))
+
+    # boards is an array (or a list of arrays) of shape (nbBoards, nbPoints), or a
+    # single board. Returns a dictionary of arrays of nbBoards integers.
+    def features(self, boards, color):
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, self._nbPoints)
+        opponent = Goban.Board.flip(color)
+        padded = np.empty((boards.shape[0], self._nbPoints + 1), dtype=np.int8)
+        padded[:, :-1] = boards
+        padded[:, -1] = _OFFBOARD
+        around = padded[:, self._neighbors] # (nbBoards, nbPoints, 4)
+        ownAround = (around == color).any(axis=2)
+        opponentAround = (around == opponent).any(axis=2)
+        empty = boards == Goban.Board._EMPTY
+        stones = np.count_nonzero(boards == color, axis=1) - np.count_nonzero(boards == opponent, axis=1)
+        ownLiberties = empty & ownAround
+        opponentLiberties = empty & opponentAround
+        area = (stones + np.count_nonzero(ownLiberties & ~opponentAround, axis=1)
+                - np.count_nonzero(opponentLiberties & ~ownAround, axis=1))
+        liberties = np.count_nonzero(ownLiberties, axis=1) - np.count_nonzero(opponentLiberties, axis=1)
+        return {"stones": stones, "area": area, "liberties": liberties}
+
+    # Weighted sum of the features of each board, from the point of view of color
+    def evaluate(self, boards, color):
+        if self._weights == DEFAULT_WEIGHTS: # no need for the other features
+            boards = np.asarray(boards, dtype=np.int8).reshape(-1, self._nbPoints)
+            return (np.count_nonzero(boards == color, axis=1)
+                    - np.count_nonzero(boards == Goban.Board.flip(color), axis=1))
+        features = self.features(boards, color)
+        values = np.zeros(len(features["stones"]), dtype=np.int64)
+        for name, weight in self._weights.items():
+            if weight:
+                values = values + weight * features[name]
+        return values
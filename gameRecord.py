@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+''' Compact game records, SGF import/export and bulk replay of archives.
+
+    A record is a header followed by the moves, one byte per move on the boards
+    of less than 255 points (two bytes from 16x16), the flat coordinate of the
+    move, PASS being the largest value (255 or 65535). The header holds the size,
+    the komi (in half points), the result and the number of moves. An archive is
+    a file of records written one after the other.
+
+    The archives are read through mmap and the moves of each game come as a
+    NumPy view of the file: replayGames plays them on a Goban.Board with
+    fullPlayMove (no name parsing, no undo log, no legality check) and yields the
+    positions, for statistics or training data.
+
+    Usage:
+      python gameRecord.py archive.gor            (statistics of the archive)
+      python gameRecord.py archive.gor --sgf dir  (exports the games to SGF files)
+'''
+
+import os
+import re
+import mmap
+import time
+import struct
+import argparse
+import collections
+import numpy as np
+import Goban
+
+MAGIC = b"GOR1"
+HEADER = struct.Struct("<4sBBhBxI") # magic, size, bytes per move, komi * 2, result, number of moves
+RESULTS = ("?", "0-1", "1-0", "1/2-1/2") # codes of the results ("0-1": black wins), "?" if unknown
+
+# size and komi of the game, result as Goban.Board.result() (or "?"), moves as
+# flat coordinates (-1 for PASS)
+GameRecord = collections.namedtuple("GameRecord", ["size", "komi", "result", "moves"])
+
+def _moveType(size):
+    return np.dtype("u1") if size * size < 255 else np.dtype("<u2")
+
+# The record of the game played on the board (the result is known once the game is over)
+def fromBoard(board):
+    result = board.result() if board.is_game_over() else "?"
+    nameToFcoord = board._tables.nameToFcoord
+    return GameRecord(board._BOARDSIZE, board._komi, result,
+        [nameToFcoord[m] for m in board._historyMoveNames])
+
+def encode(record):
+    moveType = _moveType(record.size)
+    passCode = np.iinfo(moveType).max
+    moves = np.array([passCode if m == -1 else m for m in record.moves], dtype=moveType)
+    return HEADER.pack(MAGIC, record.size, moveType.itemsize, int(round(record.komi * 2)),
+        RESULTS.index(record.result), len(moves)) + moves.tobytes()
+
+class ArchiveWriter:
+    ''' Appends records to an archive file (a new file if not append) '''
+
+    def __init__(self, path, append=True):
+        self._file = open(path, "ab" if append else "wb")
+
+    def write(self, record):
+        self._file.write(encode(record))
+
+    def close(self):
+        self._file.close()
+
+# Writes a new archive of the records (replacing the file if it exists)
+def writeArchive(path, records):
+    writer = ArchiveWriter(path, append=False)
+    for record in records:
+        writer.write(record)
+    writer.close()
+
+# Yields the records of the archive (the moves being a read only NumPy view of
+# the file, PASS coded as the largest value of their type, see passCode)
+def readRawArchive(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        # Not closed here: the views of the moves keep the map alive, it is unmapped
+        # when the last one is released
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = 0
+    while offset < len(data):
+        magic, size, moveBytes, komi, result, nbMoves = HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError("%s: no game record at offset %d" % (path, offset))
+        offset += HEADER.size
+        moves = np.frombuffer(data, dtype=_moveType(size), count=nbMoves, offset=offset)
+        offset += nbMoves * moveBytes
+        yield GameRecord(size, komi / 2, RESULTS[result], moves)
+
+def passCode(size):
+    return int(np.iinfo(_moveType(size)).max)
+
+# Same as readRawArchive, the moves being lists of flat coordinates (-1 for PASS)
+def readArchive(path):
+    for record in readRawArchive(path):
+        moves = record.moves.tolist()
+        code = passCode(record.size)
+        yield record._replace(moves=[-1 if m == code else m for m in moves])
+
+# Plays the games of the records and yields (game index, ply, board) after each
+# move (and before the first one), or every every moves. The board is the same
+# object for all the positions of a game and is changed by the next move: the
+# caller copies what it keeps (board._board.copy(), features...).
+def replayGames(records, every=1):
+    for index, record in enumerate(records):
+        board = Goban.Board(size=record.size, komi=record.komi)
+        moves = record.moves.tolist() if isinstance(record.moves, np.ndarray) else record.moves
+        code = passCode(record.size)
+        yield index, 0, board
+        for ply, m in enumerate(moves, 1):
+            board.fullPlayMove(-1 if m == code else m)
+            if ply % every == 0:
+                yield index, ply, board
+
+# SGF
+
+_SGF_RESULTS = {"0-1": "B+", "1-0": "W+", "1/2-1/2": "0", "?": "?"}
+
+def _sgfPoint(fcoord, size):
+    if fcoord == -1:
+        return ""
+    line, column = divmod(fcoord, size)
+    return chr(ord("a") + column) + chr(ord("a") + line)
+
+def toSGF(record):
+    nodes = ["(;GM[1]FF[4]CA[UTF-8]SZ[%d]KM[%s]RE[%s]" % (record.size, record.komi,
+        _SGF_RESULTS[record.result])]
+    moves = record.moves.tolist() if isinstance(record.moves, np.ndarray) else record.moves
+    code = passCode(record.size)
+    for ply, m in enumerate(moves):
+        nodes.append(";%s[%s]" % ("BW"[ply % 2], _sgfPoint(-1 if m == code else m, record.size)))
+    return "".join(nodes) + ")\n"
+
+_SGF_PROPERTY = re.compile(r"([A-Z]+)((?:\[(?:\\.|[^\]\\])*\]\s*)+)")
+_SGF_VALUE = re.compile(r"\[((?:\\.|[^\]\\])*)\]")
+
+# The main line of the first game of the SGF text. The setup properties (AB, AW)
+# are not supported, and the moves must alternate, black first (as the records
+# are replayed).
+def fromSGF(text):
+    start = text.find("(;")
+    if start == -1:
+        raise ValueError("no SGF game found")
+    size, komi, result = Goban.Board._BOARDSIZE, Goban.Board._KOMI, "?"
+    moves = []
+    # The main line is the first variation of each node: the text up to the first
+    # closing parenthesis (outside of the property values)
+    mainLine = []
+    i = start
+    while i < len(text) and text[i] != ")":
+        if text[i] == "[":
+            end = i + 1
+            while text[end] != "]":
+                end += 2 if text[end] == "\\" else 1
+            mainLine.append(text[i:end + 1])
+            i = end + 1
+        else:
+            mainLine.append(text[i])
+            i += 1
+    for name, values in _SGF_PROPERTY.findall("".join(mainLine)):
+        values = _SGF_VALUE.findall(values)
+        if name == "SZ":
+            size = int(values[0].split(":")[0])
+        elif name == "KM":
+            komi = float(values[0] or 0)
+        elif name == "RE":
+            value = values[0].upper()
+            result = ("0-1" if value.startswith("B+") else "1-0" if value.startswith("W+")
+                else "1/2-1/2" if value in ("0", "DRAW") else "?")
+        elif name in ("B", "W"):
+            if name != "BW"[len(moves) % 2]:
+                raise ValueError("SGF move %d is played by %s, the moves must alternate from black"
+                    % (len(moves) + 1, name))
+            point = values[0]
+            if point == "" or (point == "tt" and size <= 19):
+                moves.append(-1)
+            else:
+                moves.append((ord(point[1]) - ord("a")) * size + ord(point[0]) - ord("a"))
+        elif name in ("AB", "AW", "AE"):
+            raise ValueError("SGF setup properties are not supported")
+        elif name == "PL" and values[0].upper() != "B":
+            raise ValueError("SGF games where white plays first are not supported")
+    return GameRecord(size, komi, result, moves)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Statistics and SGF export of a game archive")
+    parser.add_argument("archive", help="archive of game records")
+    parser.add_argument("--sgf", default=None, help="directory where the games are exported as SGF")
+    args = parser.parse_args(argv)
+
+    if args.sgf:
+        os.makedirs(args.sgf, exist_ok=True)
+        for index, record in enumerate(readRawArchive(args.archive)):
+            with open(os.path.join(args.sgf, "game%06d.sgf" % index), "w") as f:
+                f.write(toSGF(record))
+    start = time.perf_counter()
+    results = collections.Counter()
+    def countedRecords():
+        for record in readRawArchive(args.archive):
+            results[record.result] += 1
+            yield record
+    nbPositions = 0
+    for index, ply, board in replayGames(countedRecords()):
+        nbPositions += 1
+    nbGames = sum(results.values())
+    elapsed = time.perf_counter() - start
+    print("%d games, %d positions replayed in %.2fs (%.0f positions/s)" % (nbGames, nbPositions,
+        elapsed, nbPositions / elapsed if elapsed else 0))
+    print("results: " + ", ".join("%s %d" % (r, n) for r, n in sorted(results.items())))
+
+if __name__ == "__main__":
+    main()
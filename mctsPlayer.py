@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+''' Monte Carlo Tree Search (UCT) player.
+
+    Each iteration walks down the tree with UCB1, expands one move, finishes the
+    game with a fast playout (playoutPolicy) and updates the statistics of the path.
+    Everything is played on the player's own board with push_fcoord/pop, in flat
+    coordinates: the playouts never build the list of move names.
+
+    The subtree of the move played (and of the opponent answer) is kept between
+    two calls to getPlayerMove.
+'''
+
+import math
+import time
+import random
+import Goban
+import parallelSearch
+import endgame
+import playoutPolicy
+from playerInterface import *
+
+class Node:
+    __slots__ = ("move", "parent", "player", "children", "untried", "visits", "wins")
+
+    # player is the color that played move to reach this node
+    def __init__(self, move, parent, player, legalMoves):
+        self.move = move
+        self.parent = parent
+        self.player = player
+        self.children = {}
+        self.untried = legalMoves
+        self.visits = 0
+        self.wins = 0.0
+
+    def selectChild(self, exploration):
+        logVisits = math.log(self.visits)
+        return max(self.children.values(), key=lambda c: c.wins / c.visits
+                + exploration * math.sqrt(logVisits / c.visits))
+
+class mctsPlayer(PlayerInterface):
+
+    SETTLED_CHECK = 30 # number of playout moves between two checks of the end of the game
+
+    # The search of a move stops after playouts playouts if given, after timeBudget
+    # seconds otherwise. With workers > 1, the search is run by a pool of processes,
+    # each one with its own tree (see parallelSearch)
+    def __init__(self, playouts=None, timeBudget=1.0, exploration=1.0, maxPlayoutMoves=None, seed=None,
+            workers=1):
+        self._board = Goban.Board()
+        self._mycolor = None
+        self._playouts = playouts
+        self._timeBudget = timeBudget
+        self._exploration = exploration
+        self._maxPlayoutMoves = maxPlayoutMoves or 3 * self._board._BOARDSIZE**2
+        self._rng = random.Random(seed)
+        self._policy = playoutPolicy.PlayoutPolicy(self._rng)
+        self._root = None
+        self._stats = {}
+        self._parallel = parallelSearch.ParallelSearch(workers, {"exploration": exploration,
+            "maxPlayoutMoves": maxPlayoutMoves}) if workers > 1 else None
+
+    def getPlayerName(self):
+        return "MCTS Player"
+
+    def getPlayerMove(self):
+        if self._board.is_game_over():
+            print("Referee told me to play but the game is over!")
+            return "PASS"
+        fcoord = self.search() if self._parallel is None else self.parallelSearch()
+        move = Goban.Board.coordToName(fcoord)
+        self._board.push_fcoord(fcoord)
+        self._advanceRoot(fcoord)
+        print("I am playing ", move)
+        print("MCTS statistics: ", self._stats)
+        print("My current board :")
+        self._board.prettyPrint()
+        return move
+
+    def playOpponentMove(self, move):
+        print("Opponent played ", move)
+        self._board.push(move)
+        self._advanceRoot(-1 if move == "PASS" else Goban.Board.flatten(Goban.Board.moveNameToCoord(move)))
+
+    def newGame(self, color):
+        self._mycolor = color
+        self._opponent = Goban.Board.flip(color)
+        self._root = None
+
+    def endGame(self, winner):
+        if self._mycolor == winner:
+            print("I won!!!")
+        else:
+            print("I lost :(!!")
+
+    # Keeps the subtree of the move just played, if it was explored
+    def _advanceRoot(self, fcoord):
+        if self._root is not None and fcoord in self._root.children:
+            self._root = self._root.children[fcoord]
+            self._root.parent = None
+        else:
+            self._root = None
+
+    def _newNode(self, move, parent):
+        board = self._board
+        if board.is_game_over():
+            legalMoves = []
+        elif endgame.canBeSettled(board):
+            legalMoves = endgame.meaningfulMoves(board) # no move in pass-alive territories
+        else:
+            legalMoves = board.legal_fcoords()
+        return Node(move, parent, Goban.Board.flip(board._nextPlayer), legalMoves)
+
+    # Runs the MCTS iterations from the current position and returns the most
+    # visited move
+    def search(self):
+        if self._root is None:
+            self._root = self._newNode(None, None)
+        reused = self._root.visits
+        nbPlayouts = 0
+        start = time.perf_counter()
+        deadline = start + self._timeBudget
+        while True:
+            if self._playouts is not None:
+                if nbPlayouts >= self._playouts:
+                    break
+            elif time.perf_counter() >= deadline:
+                break
+            self.iteration()
+            nbPlayouts += 1
+        elapsed = time.perf_counter() - start
+        self._stats = {"playouts": nbPlayouts, "playoutsPerSecond": nbPlayouts / elapsed if elapsed > 0 else 0.0,
+                "reusedVisits": reused, "rootVisits": self._root.visits}
+        if not self._root.children:
+            return -1
+        best = max(self._root.children.values(), key=lambda c: c.visits)
+        return best.move
+
+    # Root parallel search: the most visited move over all the worker trees
+    def parallelSearch(self):
+        start = time.perf_counter()
+        children, nbPlayouts = self._parallel.mcts(self._board, self._mycolor, self._playouts,
+            self._timeBudget)
+        elapsed = time.perf_counter() - start
+        self._stats = {"playouts": nbPlayouts, "playoutsPerSecond": nbPlayouts / elapsed if elapsed > 0 else 0.0,
+                "workers": self._parallel.workers()}
+        if not children:
+            return -1
+        return max(children, key=lambda m: children[m][0])
+
+    def iteration(self):
+        board = self._board
+        level = len(board._trailMoves)
+        node = self._root
+        # Selection
+        while not node.untried and node.children:
+            node = node.selectChild(self._exploration)
+            board.push_fcoord(node.move)
+        # Expansion
+        if node.untried:
+            move = node.untried.pop(self._rng.randrange(len(node.untried)))
+            board.push_fcoord(move)
+            child = self._newNode(move, node)
+            node.children[move] = child
+            node = child
+        # Simulation
+        winner = self.winner(self.playout())
+        while len(board._trailMoves) > level:
+            board.pop()
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if winner == node.player:
+                node.wins += 1.0
+            elif winner == Goban.Board._EMPTY:
+                node.wins += 0.5
+            node = node.parent
+
+    # Plays the moves of the playout policy (random moves that do not fill own
+    # eyes, see playoutPolicy) until the end of the game, or until the position is
+    # settled (checked every SETTLED_CHECK moves). Returns the result of the game
+    # if it is known before the end, None otherwise.
+    def playout(self):
+        board = self._board
+        lastMove = board.nameToFcoord(board._historyMoveNames[-1]) if board._historyMoveNames else -1
+        nbMoves = 0
+        while not board.is_game_over() and nbMoves < self._maxPlayoutMoves:
+            lastMove = self._policy.chooseMove(board, lastMove)
+            board.push_fcoord(lastMove)
+            nbMoves += 1
+            if nbMoves % self.SETTLED_CHECK == 0 and endgame.canBeSettled(board):
+                result = endgame.settledResult(board)
+                if result is not None:
+                    return result
+        return None
+
+    def winner(self, result=None):
+        res = result or self._board.result()
+        if res == "1-0":
+            return Goban.Board._WHITE
+        if res == "0-1":
+            return Goban.Board._BLACK
+        return Goban.Board._EMPTY
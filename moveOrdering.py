@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+''' Move ordering for the alpha-beta searches of myPlayer.
+
+    Moves are searched in this order:
+     - the move stored in the transposition table (the principal variation of
+       the previous iteration),
+     - captures, then moves saving an own string in atari or putting an
+       opponent string in atari (read from the liberties of the strings,
+       Board._stringLiberties),
+     - the killer moves of the ply (moves that caused a cutoff in a sibling node),
+     - the other moves, by their history heuristic score,
+     - PASS.
+'''
+
+TT_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28
+ATARI_SCORE = 1 << 27
+KILLER_SCORE = 1 << 26
+PASS_SCORE = -1
+
+class MoveOrdering:
+
+    def __init__(self, nbPoints, maxPly=64):
+        self._nbPoints = nbPoints
+        self._maxPly = maxPly
+        self.clear()
+
+    def clear(self):
+        self._killers = [[None, None] for _ in range(self._maxPly)]
+        # _history[color][fcoord], color 0 is unused
+        self._history = [[0] * self._nbPoints for _ in range(3)]
+
+    # Called between two moves: old statistics are worth less in the new position
+    def age(self):
+        self._killers = [[None, None] for _ in range(self._maxPly)]
+        for table in self._history[1:]:
+            for fcoord in range(self._nbPoints):
+                table[fcoord] >>= 1
+
+    # Tactical score of a move from the liberties of the strings around it: an
+    # opponent string whose only liberty is the move is captured, one left with a
+    # single liberty is put in atari, and an own string in atari is saved (or at
+    # least extended) by the move
+    def tacticalScore(self, board, fcoord, color):
+        if board._nbEmptyNeighbors[fcoord] == board._nbNeighbors[fcoord]:
+            return 0 # no string around
+        opponent = board.flip(color)
+        bit = 1 << fcoord
+        score = 0
+        i = board._neighborsEntries[fcoord]
+        while board._neighbors[i] != -1:
+            fn = board._neighbors[i]
+            i += 1
+            if board._board[fn] == board._EMPTY:
+                continue
+            liberties = board._stringLiberties[board.getStringOfStone(fn)]
+            if board._board[fn] == opponent:
+                liberties &= ~bit
+                if liberties == 0:
+                    return CAPTURE_SCORE
+                if liberties & (liberties - 1) == 0:
+                    score = ATARI_SCORE
+            elif liberties == bit:
+                score = ATARI_SCORE
+        return score
+
+    def orderMoves(self, board, moves, ply, ttMove=None):
+        color = board._nextPlayer
+        history = self._history[color]
+        killers = self._killers[ply] if ply < self._maxPly else (None, None)
+        scores = {}
+        for m in moves:
+            if m == ttMove:
+                scores[m] = TT_SCORE
+            elif m == -1:
+                scores[m] = PASS_SCORE
+            else:
+                score = self.tacticalScore(board, m, color)
+                if score == 0 and m in killers:
+                    score = KILLER_SCORE
+                scores[m] = score + history[m]
+        return sorted(moves, key=lambda m: -scores[m])
+
+    # The move caused a beta (or alpha) cutoff at this ply
+    def recordCutoff(self, board, move, ply, depth):
+        if move == -1:
+            return
+        self._history[board._nextPlayer][move] += depth * depth
+        if ply < self._maxPly:
+            killers = self._killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
@@ -2,15 +2,68 @@
 
 import math
 import time
+import threading
+import numpy as np
 import Goban
+import transpositionTable as tt
+import moveOrdering
+import evaluation
+import endgame
+import tactics
+import openingBook
+import parallelSearch
 from random import randint, choice
 from playerInterface import *
 
+# Raised inside the search when the time given for the move is over
+class SearchTimeout(Exception):
+    pass
+
 class myPlayer(PlayerInterface):
 
-    def __init__(self):
+    QUIESCENCE_DEPTH = 6 # tactical moves searched beyond the depth of the search
+
+    # moveTime is the maximum time (in seconds) for one move, gameTime the time
+    # for all the moves of the game. With workers > 1, the root moves are searched
+    # in parallel by a pool of processes (see parallelSearch). evalWeights are the
+    # weights of the features of evaluation.BatchEvaluator, and with batchLeaves
+    # the leaves below a node are evaluated all at once. With tacticalReading, the
+    # leaves where the last move left strings in atari are resolved with the
+    # captures and escapes read by tactics.TacticalReader (see _quiescence).
+    # With ponder, the player keeps searching on the opponent's time (see
+    # _startPondering); only with workers == 1. book is the path of an opening
+    # book (see openingBook), played until the game leaves it
+    def __init__(self, ttMemory=16 * 2**20, moveTime=10.0, gameTime=300.0, maxDepth=30, workers=1,
+            evalWeights=None, batchLeaves=True, tacticalReading=True, ponder=False, book=None):
         self._board = Goban.Board()
         self._mycolor = None
+        self._tt = tt.TranspositionTable(ttMemory)
+        self._ordering = moveOrdering.MoveOrdering(self._board._BOARDSIZE**2)
+        self._evaluator = evaluation.BatchEvaluator(self._board._BOARDSIZE, evalWeights)
+        self._batchLeaves = batchLeaves
+        self._tactics = tactics.TacticalReader() if tacticalReading else None
+        # The boards of the leaves evaluated together (a node has at most one
+        # child per point, and PASS)
+        self._leafBoards = np.empty((self._board._BOARDSIZE**2 + 1, self._board._BOARDSIZE**2), dtype='int8')
+        self._rootDepth = 0
+        self.resetStats()
+        self._moveTime = moveTime
+        self._gameTime = gameTime
+        self._maxDepth = maxDepth
+        self._timeUsed = 0.0
+        self._deadline = None
+        self._reachedDepthLimit = False
+        self._parallel = parallelSearch.ParallelSearch(workers, {"ttMemory": ttMemory,
+            "evalWeights": evalWeights, "batchLeaves": batchLeaves, "tacticalReading": tacticalReading}) \
+            if workers > 1 else None
+        self._ponder = ponder and self._parallel is None
+        self._ponderThread = None
+        self._ponderMove = None
+        self._stopRequested = False
+        self._ponderHits = 0
+        self._ponderMisses = 0
+        self._book = openingBook.OpeningBook(book) if book else None
+        self._inBook = self._book is not None
 
     def getPlayerName(self):
         return "My Player"
@@ -19,43 +72,168 @@ class myPlayer(PlayerInterface):
         if self._board.is_game_over():
             print("Referee told me to play but the game is over!")
             return "PASS"
-        move,_ = self.MaxMinCoupAB(2)
+        self._stopPondering()
+        start = time.perf_counter()
+        move = self._book.bestMove(self._board) if self._inBook else None
+        if move is not None:
+            value, depth = None, 0
+            print("Book move")
+        else:
+            self._inBook = False # no need to look the next positions up
+            move, value, depth = self.iterativeDeepening(self.moveBudget())
+        self._timeUsed += time.perf_counter() - start
         self._board.push(move)
         print("I am playing ", move)
+        print("Searched at depth %d (value %s) in %.2fs" % (depth, value, time.perf_counter() - start))
+        print("Search statistics: ", self._stats)
+        print("Transposition table: ", self._tt.stats())
+        if self._tactics is not None:
+            print("Tactical reader: ", self._tactics.stats())
         print("My current board :")
         self._board.prettyPrint()
+        self._startPondering()
         return move
 
     def playOpponentMove(self, move):
         print("Opponent played ", move)
+        ponderMove = self._stopPondering()
+        if ponderMove is not None:
+            if Goban.Board.coordToName(ponderMove) == move:
+                self._ponderHits += 1
+            else:
+                self._ponderMisses += 1
         self._board.push(move)
 
     def newGame(self, color):
+        self._stopPondering()
+        if color != self._mycolor:
+            # The values of the transposition table are from my point of view
+            self._tt.clear()
+            self._ordering.clear()
         self._mycolor = color
         self._opponent = Goban.Board.flip(color)
+        self._timeUsed = 0.0
+        self._ponderHits = 0
+        self._ponderMisses = 0
+        self._inBook = self._book is not None
 
     def endGame(self, winner):
+        self._stopPondering()
+        if self._ponderHits or self._ponderMisses:
+            print("Pondering: %d hits, %d misses" % (self._ponderHits, self._ponderMisses))
         if self._mycolor == winner:
             print("I won!!!")
         else:
             print("I lost :(!!")
 
 
+    # Pondering: after my move, the reply the last search expects (the best move
+    # stored in the transposition table for the position) is played on the board
+    # and a search of my next move runs in a thread until the opponent's move
+    # arrives. Its entries stay in the transposition table: if the opponent
+    # played the expected move, the next search starts with them; otherwise they
+    # are of no use and get replaced as the table fills. The Python threads share
+    # the GIL, so this only pays when the opponent runs in another process.
+    def _startPondering(self):
+        if not self._ponder or self._board.is_game_over():
+            return
+        key, transform = self._ttKey()
+        entry = self._tt.probe(key)
+        if entry is None or entry[4] is None:
+            return
+        move = self._board.untransformFcoord(entry[4], transform)
+        if move != -1 and (move not in self._board._empties or not self._board.isLegalMove(move)):
+            return
+        self._board.push_fcoord(move)
+        if self._board.is_game_over():
+            self._board.pop()
+            return
+        self._ponderMove = move
+        self._stopRequested = False
+        self._ponderThread = threading.Thread(target=self.iterativeDeepening, args=(math.inf,), daemon=True)
+        self._ponderThread.start()
+
+    # Stops the pondering search (if any), takes the expected reply back and
+    # returns it
+    def _stopPondering(self):
+        if self._ponderThread is None:
+            return None
+        self._stopRequested = True
+        self._ponderThread.join()
+        self._ponderThread = None
+        self._stopRequested = False
+        self._board.pop()
+        move, self._ponderMove = self._ponderMove, None
+        return move
+
+    # Time allowed for the next move: a share of the time left for the game
+    # (assuming the game lasts until about half of the empty points are played),
+    # and never more than moveTime
+    def moveBudget(self):
+        timeLeft = self._gameTime - self._timeUsed
+        movesLeft = max(10, len(self._board._empties) // 2)
+        return max(0.0, min(self._moveTime, timeLeft / movesLeft))
+
+    '''
+    Recherches MaxMinCoupAB de profondeur 1, 2, 3... tant que le temps budget
+    (en secondes) n'est pas écoulé. Retourne le coup, la valeur et la profondeur
+    de la dernière recherche terminée. La profondeur 1 est toujours terminée.
+    '''
+    def iterativeDeepening(self, budget):
+        deadline = time.perf_counter() + budget
+        self._ordering.age()
+        self.resetStats()
+        level = len(self._board._trailMoves)
+        # In a settled position, nothing but the dame is worth searching
+        rootMoves = endgame.meaningfulMoves(self._board) if endgame.canBeSettled(self._board) \
+            else self._board.legal_fcoords()
+        if rootMoves == [-1]:
+            return "PASS", None, 0
+        best = None
+        for depth in range(1, self._maxDepth + 1):
+            self._reachedDepthLimit = False
+            try:
+                move, value = self.MaxMinCoupAB(depth, rootMoves)
+            except SearchTimeout:
+                # The search was interrupted in the middle of the tree
+                while len(self._board._trailMoves) > level:
+                    self._board.pop()
+                break
+            best = (move, value, depth)
+            self._searchedRootValues = self._rootValues # values of the last finished search
+            self._deadline = deadline
+            # The best moves of this iteration are searched first at the next one
+            rootMoves = sorted(rootMoves, key=lambda m: -self._rootValues[m])
+            if not self._reachedDepthLimit:
+                break # The whole tree was searched, deeper searches would give the same
+            if time.perf_counter() >= self._deadline:
+                break
+        self._deadline = None
+        return best
+
     '''
     retourne le meilleur coup à jouer et sa valeur, selon
     une recherche MinMax + AlphaBeta à profondeur depth
     '''
-    def MaxMinCoupAB(self, depth=3):
+    def MaxMinCoupAB(self, depth=3, rootMoves=None):
         if self._board.is_game_over() or depth == 0:
             return None
 
+        if rootMoves is None:
+            rootMoves = self._board.legal_fcoords()
+        if self._parallel is not None:
+            return self.parallelMaxMinCoupAB(depth, rootMoves)
+
         v, coup = None, None
         bestMoves = []
         alpha = -math.inf
         beta = math.inf
-        for m in self._board.legal_moves():
-            self._board.push(m)
+        self._rootValues = {}
+        self._rootDepth = depth
+        for m in rootMoves:
+            self._board.push_fcoord(m)
             ret = self.MinMaxAB(alpha, beta, depth - 1)
+            self._rootValues[m] = ret
             if v is None or ret > v:
                 bestMoves.clear()
                 bestMoves.append(m)
@@ -64,60 +242,271 @@ class myPlayer(PlayerInterface):
                 bestMoves.append(m)
             self._board.pop()
 
-        coup = choice(bestMoves)
+        coup = Goban.Board.coordToName(choice(bestMoves))
         return (coup, v)
 
+    # Same as MaxMinCoupAB, each root move being searched by a worker process
+    def parallelMaxMinCoupAB(self, depth, rootMoves):
+        budget = math.inf if self._deadline is None else self._deadline - time.perf_counter()
+        values, reachedDepthLimit, stats = self._parallel.alphaBeta(self._board, self._mycolor,
+            depth, rootMoves, budget)
+        for k, n in stats.items():
+            self._stats[k] += n
+        if values is None:
+            raise SearchTimeout()
+        self._reachedDepthLimit = self._reachedDepthLimit or reachedDepthLimit
+        self._rootValues = values
+        v = max(values.values())
+        bestMoves = [m for m in rootMoves if values[m] == v]
+        return (Goban.Board.coordToName(choice(bestMoves)), v)
+
+    # Value of a finished game, from my point of view ("1-0" is a win for white)
+    def gameOverValue(self):
+        res = self._board.result()
+        if res == "1/2-1/2":
+            return 0
+        winner = Goban.Board._WHITE if res == "1-0" else Goban.Board._BLACK
+        return 400 if winner == self._mycolor else -400
+
+    def _checkTime(self):
+        if self._stopRequested or (self._deadline is not None and time.perf_counter() > self._deadline):
+            raise SearchTimeout()
+
+    # Node counts of the current search: nodes visited (interior and leaves),
+    # leaves evaluated, nodes answered by the transposition table, cutoffs and
+    # cutoffs produced by the first move searched (the quality of the ordering),
+    # leaves resolved by _quiescence
+    def resetStats(self):
+        self._stats = {"nodes": 0, "leaves": 0, "ttCutoffs": 0, "cutoffs": 0, "firstMoveCutoffs": 0,
+            "quiescence": 0}
+
+    def _orderedMoves(self, depth, ttMove):
+        return self._ordering.orderMoves(self._board, self._board.legal_fcoords(),
+            self._rootDepth - depth, ttMove)
+
+    def _recordCutoff(self, move, depth, nbSearched):
+        self._stats["cutoffs"] += 1
+        if nbSearched == 1:
+            self._stats["firstMoveCutoffs"] += 1
+        self._ordering.recordCutoff(self._board, move, self._rootDepth - depth, depth)
+
+    # Key of the current position in the transposition table, and the symmetry
+    # to the canonical position: the 8 symmetric positions share their entry
+    # (see Goban.Board.canonicalHash), and the moves are stored as seen in the
+    # canonical position. The Zobrist hash of the board does not tell who is to play.
+    def _ttKey(self):
+        key, transform = self._board.canonicalHash()
+        return key * 2 + (self._board._nextPlayer == Goban.Board._WHITE), transform
+
+    # Returns the value stored in the transposition table if it is enough to
+    # conclude at this depth, with this alpha-beta window, and the best move stored
+    def _ttLookup(self, key, transform, alpha, beta, depth):
+        entry = self._tt.probe(key)
+        if entry is None:
+            return None, None
+        _, entryDepth, value, bound, move = entry
+        if move is not None:
+            move = self._board.untransformFcoord(move, transform)
+        if entryDepth >= depth and (bound == tt.EXACT or (bound == tt.LOWER and value >= beta)
+                or (bound == tt.UPPER and value <= alpha)):
+            return value, move
+        return None, move
+
+    def _ttStore(self, key, transform, depth, value, bound, move):
+        if move is not None:
+            move = self._board.transformFcoord(move, transform)
+        self._tt.store(key, depth, value, bound, move)
+
+    def _ttBound(self, value, alpha, beta):
+        if value <= alpha:
+            return tt.UPPER
+        if value >= beta:
+            return tt.LOWER
+        return tt.EXACT
+
+    # Values of the children of the current node at depth 1 (leaves of the tree),
+    # in the order of moves. The boards are gathered in _leafBoards and evaluated
+    # together, by batches of 1, 4, 16... moves: the first moves often give a
+    # cutoff, and the next batches are not evaluated at all then. The value is None
+    # for the leaves resolved by _quiescence: the caller searches them as usual.
+    def _leafValues(self, moves):
+        start = 0
+        batch = 1
+        while start < len(moves):
+            for v in self._evaluateChildren(moves[start:start + batch]):
+                yield v
+            start += batch
+            batch *= 4
+
+    def _evaluateChildren(self, moves):
+        board = self._board
+        values = [None] * len(moves)
+        indexes = []
+        for i, m in enumerate(moves):
+            board.push_fcoord(m)
+            if board.is_game_over():
+                values[i] = self.gameOverValue()
+            elif self._tactics is not None and self._ataris():
+                pass # left to the caller, see _leafValue
+            else:
+                self._leafBoards[len(indexes)] = board._board
+                indexes.append(i)
+            board.pop()
+        self._stats["nodes"] += sum(1 for v in values if v is not None) + len(indexes)
+        if indexes:
+            self._stats["leaves"] += len(indexes)
+            self._reachedDepthLimit = True
+            scores = self._evaluator.evaluate(self._leafBoards[:len(indexes)], self._mycolor)
+            for i, v in zip(indexes, scores.tolist()):
+                values[i] = v
+        return values
+
+    # Value of a leaf of the search: the evaluation, or with the tactical reader
+    # the value of _quiescence if the last move left strings in atari
+    def _leafValue(self, alpha, beta):
+        if self._tactics is not None:
+            strings = self._ataris()
+            if strings:
+                self._stats["quiescence"] += 1
+                return self._quiescence(alpha, beta, self.QUIESCENCE_DEPTH, strings)
+        return self.evaluate()
+
+    # The strings in atari around the last move (its own string and the opponent
+    # strings next to it), one stone of each
+    def _ataris(self):
+        board = self._board
+        if not board._historyMoveNames:
+            return []
+        fcoord = board._tables.nameToFcoord[board._historyMoveNames[-1]]
+        if fcoord == -1:
+            return []
+        strings = [fcoord] if board.isInAtari(fcoord) else []
+        i = board._neighborsEntries[fcoord]
+        while board._neighbors[i] != -1:
+            fn = board._neighbors[i]
+            i += 1
+            if board._board[fn] == board._nextPlayer and board.isInAtari(fn) \
+                    and all(board.getStringOfStone(fn) != board.getStringOfStone(f) for f in strings):
+                strings.append(fn)
+        return strings
+
+    # Quiescence search of a leaf where strings are in atari: the side to move
+    # either stops there (the evaluation), captures an opponent string of strings
+    # or saves one of its strings with the escape read by the tactical reader, and
+    # so on while the moves leave strings in atari (at most depth moves). Returns
+    # a value from my point of view, as MaxMinAB and MinMaxAB.
+    def _quiescence(self, alpha, beta, depth, strings):
+        board = self._board
+        maximizing = board._nextPlayer == self._mycolor
+        captures = []
+        escapes = []
+        for fcoord in strings:
+            if board._board[fcoord] == board._nextPlayer:
+                move = self._tactics.escapeMove(board, fcoord)
+                if move is not None and move not in escapes:
+                    escapes.append(move)
+            else:
+                move = self._tactics.captureMove(board, fcoord)
+                if move is not None and move not in captures:
+                    captures.append(move)
+        value = self.evaluate()
+        for m in captures + [m for m in escapes if m not in captures]:
+            if maximizing:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+            board.push_fcoord(m)
+            self._stats["nodes"] += 1
+            if board.is_game_over():
+                ret = self.gameOverValue()
+            else:
+                nextStrings = self._ataris() if depth > 1 else []
+                ret = self._quiescence(alpha, beta, depth - 1, nextStrings) if nextStrings else self.evaluate()
+            board.pop()
+            value = max(value, ret) if maximizing else min(value, ret)
+        return value
+
     def MaxMinAB(self, alpha, beta, depth=3):
+        self._stats["nodes"] += 1
         if self._board.is_game_over():
-            res = self._board.result()
-            if res == "1-0":
-                return 400
-            elif res == "0-1":
-                return -400
-            else:
-                return 0
+            return self.gameOverValue()
 
         if depth == 0:
-            return self.evaluate()
+            self._stats["leaves"] += 1
+            self._reachedDepthLimit = True
+            return self._leafValue(alpha, beta)
 
-        for m in self._board.legal_moves():
-            self._board.push(m)
-            ret = self.MinMaxAB(alpha, beta, depth - 1)
+        self._checkTime()
+        key, transform = self._ttKey()
+        value, ttMove = self._ttLookup(key, transform, alpha, beta, depth)
+        if value is not None:
+            self._stats["ttCutoffs"] += 1
+            self._reachedDepthLimit = True # the stored search may have been cut by its depth
+            return value
+
+        alphaOrig = alpha
+        bestMove = None
+        moves = self._orderedMoves(depth, ttMove)
+        leafValues = self._leafValues(moves) if depth == 1 and self._batchLeaves else None
+        for i, m in enumerate(moves):
+            ret = next(leafValues) if leafValues is not None else None
+            if ret is None:
+                self._board.push_fcoord(m)
+                ret = self.MinMaxAB(alpha, beta, depth - 1)
+                self._board.pop()
+            if ret > alpha or bestMove is None:
+                bestMove = m
             alpha = max(alpha, ret)
-            self._board.pop()
             if alpha >= beta:
+                self._recordCutoff(m, depth, i + 1)
+                self._ttStore(key, transform, depth, beta, tt.LOWER, bestMove)
                 return beta
 
+        self._ttStore(key, transform, depth, alpha, self._ttBound(alpha, alphaOrig, beta), bestMove)
         return alpha
 
     def MinMaxAB(self, alpha, beta, depth=3):
+        self._stats["nodes"] += 1
         if self._board.is_game_over():
-            res = self._board.result()
-            if res == "1-0":
-                return 400
-            elif res == "0-1":
-                return -400
-            else:
-                return 0
+            return self.gameOverValue()
 
         if depth == 0:
-            return self.evaluate()
+            self._stats["leaves"] += 1
+            self._reachedDepthLimit = True
+            return self._leafValue(alpha, beta)
 
-        for m in self._board.legal_moves():
-            self._board.push(m)
-            ret = self.MaxMinAB(alpha, beta, depth - 1)
+        self._checkTime()
+        key, transform = self._ttKey()
+        value, ttMove = self._ttLookup(key, transform, alpha, beta, depth)
+        if value is not None:
+            self._stats["ttCutoffs"] += 1
+            self._reachedDepthLimit = True # the stored search may have been cut by its depth
+            return value
+
+        betaOrig = beta
+        bestMove = None
+        moves = self._orderedMoves(depth, ttMove)
+        leafValues = self._leafValues(moves) if depth == 1 and self._batchLeaves else None
+        for i, m in enumerate(moves):
+            ret = next(leafValues) if leafValues is not None else None
+            if ret is None:
+                self._board.push_fcoord(m)
+                ret = self.MaxMinAB(alpha, beta, depth - 1)
+                self._board.pop()
+            if ret < beta or bestMove is None:
+                bestMove = m
             beta = min(beta, ret)
-            self._board.pop()
             if alpha >= beta:
+                self._recordCutoff(m, depth, i + 1)
+                self._ttStore(key, transform, depth, alpha, tt.UPPER, bestMove)
                 return alpha
 
+        self._ttStore(key, transform, depth, beta, self._ttBound(beta, alpha, betaOrig), bestMove)
         return beta
 
 
-    def canReach(m, color):
-        return 0
-
-
     # calcule la différence de score entre le joueur et l'adversaire
     def computeScore(self):
         myScore = 0
@@ -127,18 +516,13 @@ class myPlayer(PlayerInterface):
                 myScore += 1
             elif self._board._board[m] == self._opponent:
                 oppScore += 1
-                '''
-            else:
-                if canReach(m, self._mycolor) and not (canReach(m, self._opponent)):
-                    myScore += 1
-                elif not (canReach(m, self._mycolor)) and canReach(m, self._opponent):
-                    oppScore += 1
-                    '''
         return myScore - oppScore
 
+    # différence des scores par zones (Tromp-Taylor, komi compris) entre le joueur
+    # et l'adversaire
     def computeScore2(self):
-        #print("Score :", (self._board._nbWHITE + self._board._capturedBLACK) - (self._board._nbBLACK + self._board._capturedWHITE), "----------------------------------------------------------------")
-        return (self._board._nbWHITE + self._board._capturedBLACK) - (self._board._nbBLACK + self._board._capturedWHITE)
+        black, white = self._board.score()
+        return black - white if self._mycolor == Goban.Board._BLACK else white - black
 
     def evaluate(self):
-        return self.computeScore()
+        return self._evaluator.evaluate(self._board._board, self._mycolor)[0].item()
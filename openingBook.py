@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+''' Opening book: moves searched offline for the first positions of the game.
+
+    The book is a binary file: a header (magic, board size, number of records)
+    followed by fixed size records (key, move, score, visits) sorted by key. The
+    key is the canonical hash of the position (see Goban.Board.canonicalHash) with
+    the side to move, so the 8 symmetric positions share their records, and the
+    move is stored as seen in the canonical position. A position may have several
+    records (up to MAX_MOVES), one per good move.
+
+    At game time, the file is mapped in memory (mmap) and the records are read
+    in place as a NumPy array: nothing is parsed when the book is opened, and a
+    lookup is a binary search on the keys.
+
+    The book is built by searching the positions with myPlayer: from the empty
+    board, each position reached in less than plies moves is searched for
+    searchTime seconds, its best moves (at most width of them, the ones with the
+    best value) are recorded and played to reach the next positions. visits is
+    the number of times the builder reached the position.
+
+    Usage:
+      python openingBook.py book.bin --plies 4 --width 2 --time 5
+'''
+
+import mmap
+import struct
+import argparse
+import numpy as np
+import Goban
+
+MAGIC = b"GOBOOK1\0"
+HEADER = struct.Struct("<8sII") # magic, board size, number of records
+RECORD = np.dtype([("key", "<u8"), ("move", "<i2"), ("score", "<i2"), ("visits", "<u4")])
+KEY_MASK = 2**64 - 1
+MAX_MOVES = 8 # records of a position read by a lookup
+
+# Key of the position in the book: the canonical hash (shifted to make room for
+# the side to move), and the symmetry to the canonical position
+def bookKey(board):
+    key, transform = board.canonicalHash()
+    return ((key << 1) | (board._nextPlayer == Goban.Board._WHITE)) & KEY_MASK, transform
+
+class OpeningBook:
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            self._file.close()
+            raise ValueError("%s is not an opening book" % path)
+        magic, self._size, nbRecords = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or HEADER.size + nbRecords * RECORD.itemsize > len(self._map):
+            self.close()
+            raise ValueError("%s is not an opening book" % path)
+        self._records = np.frombuffer(self._map, dtype=RECORD, count=nbRecords, offset=HEADER.size)
+        self._keys = self._records["key"]
+
+    def close(self):
+        self._records = self._keys = None
+        self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self._records)
+
+    # The records of the position as (move, score, visits) tuples, the moves being
+    # flat coordinates on the board (-1 for PASS)
+    def lookup(self, board):
+        if board._BOARDSIZE != self._size:
+            return []
+        key, transform = bookKey(board)
+        start = int(self._keys.searchsorted(np.uint64(key)))
+        entries = []
+        for recordKey, move, score, visits in self._records[start:start + MAX_MOVES].tolist():
+            if recordKey != key:
+                break
+            entries.append((board.untransformFcoord(move, transform), score, visits))
+        return entries
+
+    # The name of the best legal move of the book for the position (best score,
+    # then the most visited), None if the position is not in the book
+    def bestMove(self, board):
+        entries = [e for e in self.lookup(board) if e[0] == -1 or board.isLegalMove(e[0])]
+        if not entries:
+            return None
+        move = max(entries, key=lambda e: (e[1], e[2]))[0]
+        return board.coordToName(move)
+
+def writeBook(path, size, records):
+    records = np.sort(np.asarray(records, dtype=RECORD), order=("key", "move"))
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, size, len(records)))
+        f.write(records.tobytes())
+
+def _clamp(value):
+    return max(-2**15, min(2**15 - 1, int(value)))
+
+# Searches the positions of the first plies moves (see the module documentation)
+# and writes the book. player is a myPlayer used for the searches.
+def buildBook(path, player, plies=4, width=2, searchTime=5.0, verbose=False):
+    size = player._board._BOARDSIZE
+    width = min(width, MAX_MOVES)
+    entries = {} # key -> {canonical move: score}
+    visits = {}
+    frontier = [[]]
+    for ply in range(plies):
+        nextFrontier = []
+        for history in frontier:
+            board = Goban.Board(size=size)
+            for m in history:
+                board.push_fcoord(m)
+            if board.is_game_over():
+                continue
+            key, transform = bookKey(board)
+            visits[key] = visits.get(key, 0) + 1
+            if key in entries:
+                continue # already searched (the same position or a symmetric one)
+            player._board = board
+            player._mycolor = board._nextPlayer
+            player._opponent = Goban.Board.flip(board._nextPlayer)
+            # Each position is searched from scratch: the values of the
+            # transposition table are from the point of view of _mycolor
+            player._tt.clear()
+            player._ordering.clear()
+            move, value, depth = player.iterativeDeepening(searchTime)
+            values = player._searchedRootValues if depth else {board.nameToFcoord(move): 0}
+            best = sorted(values, key=lambda m: -values[m])[:width]
+            best = [m for m in best if values[m] == values[best[0]]]
+            entries[key] = {board.transformFcoord(m, transform): values[m] for m in best}
+            if verbose:
+                print("ply %d %s: %s (depth %d)" % (ply, " ".join(board._historyMoveNames),
+                    " ".join("%s=%s" % (board.coordToName(m), values[m]) for m in best), depth))
+            nextFrontier.extend(history + [m] for m in best)
+        frontier = nextFrontier
+    records = [(key, move, _clamp(score), visits[key])
+        for key, moves in entries.items() for move, score in moves.items()]
+    writeBook(path, size, records)
+    return len(records)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds an opening book by searching the first positions")
+    parser.add_argument("output", help="book file")
+    parser.add_argument("--plies", type=int, default=4, help="number of moves covered by the book")
+    parser.add_argument("--width", type=int, default=2, help="moves kept in each position")
+    parser.add_argument("--time", type=float, default=5.0, help="search time per position (s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="prints the moves of each position")
+    args = parser.parse_args(argv)
+    import myPlayer
+    nbRecords = buildBook(args.output, myPlayer.myPlayer(moveTime=args.time), args.plies, args.width,
+        args.time, args.verbose)
+    print("%d records written to %s" % (nbRecords, args.output))
+
+if __name__ == "__main__":
+    main()
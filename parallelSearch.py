@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+''' Multiprocessing searches: the Python board does not run faster with threads
+    (GIL), so the work is split over a pool of processes.
+
+    Each worker process owns its players (myPlayer for alpha-beta, mctsPlayer
+    for MCTS), and so its own Goban.Board, transposition table and MCTS tree.
+    They are built with the settings of the player that created the pool (the
+    keyword arguments given to ParallelSearch), so they search the same way.
+    They are kept between two moves: a task only sends the names of the moves
+    of the game, and the worker plays the moves it does not have yet.
+
+     - alpha-beta: the root moves are searched in parallel (one task per root
+       move, with the full window, as MaxMinCoupAB does), the values are merged.
+     - MCTS: root parallelization, each worker grows its own tree for the same
+       position and the visits of the root children are summed. Sharing one tree
+       between processes would need locks on every node, far too slow in Python.
+
+    The pool is created once and reused for all the moves of the games.
+
+    Run as a script, checks that the parallel alpha-beta gives the same root
+    values as the serial one, with evaluation weights that are not the default:
+      python parallelSearch.py [depth]
+'''
+
+import os
+import sys
+import time
+import multiprocessing
+import Goban
+
+_workerPlayers = {} # players of the current worker process, by kind of search
+_playerKwargs = {} # constructor arguments of the players of the current worker process
+
+def _initWorker(playerKwargs):
+    _playerKwargs.update(playerKwargs)
+
+def _workerPlayer(kind):
+    if kind not in _workerPlayers:
+        if kind == "alphabeta":
+            import myPlayer
+            _workerPlayers[kind] = myPlayer.myPlayer(**_playerKwargs)
+        else:
+            import mctsPlayer
+            _workerPlayers[kind] = mctsPlayer.mctsPlayer(seed=os.getpid(), **_playerKwargs)
+    return _workerPlayers[kind]
+
+# Brings the board of the worker player to the position after the moves history
+def _syncBoard(player, history, color, onMove=None):
+    board = player._board
+    played = board._historyMoveNames
+    if played != history[:len(played)]: # another game
+        board.reset()
+        if onMove is not None:
+            onMove(None)
+    for move in history[len(board._historyMoveNames):]:
+        board.push(move)
+        if onMove is not None:
+            onMove(move)
+    if player._mycolor != color:
+        player.newGame(color)
+
+# The deadline is given with time.time(): perf_counter() values can not be
+# compared between processes
+def _searchRootMove(task):
+    import myPlayer
+    history, color, move, depth, deadline = task
+    player = _workerPlayer("alphabeta")
+    _syncBoard(player, history, color)
+    board = player._board
+    level = len(board._trailMoves)
+    player._deadline = time.perf_counter() + (deadline - time.time())
+    player._rootDepth = depth
+    player._reachedDepthLimit = False
+    player.resetStats()
+    try:
+        board.push_fcoord(move)
+        value = player.MinMaxAB(-float("inf"), float("inf"), depth - 1)
+    except myPlayer.SearchTimeout:
+        value = None
+    finally:
+        player._deadline = None
+        while len(board._trailMoves) > level:
+            board.pop()
+    return move, value, player._reachedDepthLimit, player._stats
+
+def _mctsMoveName(player, move):
+    if move is None:
+        player._root = None
+    else:
+        player._advanceRoot(-1 if move == "PASS" else Goban.Board.flatten(Goban.Board.moveNameToCoord(move)))
+
+def _searchMcts(task):
+    history, color, playouts, timeBudget = task
+    player = _workerPlayer("mcts")
+    _syncBoard(player, history, color, lambda move: _mctsMoveName(player, move))
+    player._playouts = playouts
+    player._timeBudget = timeBudget
+    player.search()
+    children = {m: (c.visits, c.wins) for m, c in player._root.children.items()}
+    return children, player._stats
+
+class ParallelSearch:
+
+    # playerKwargs are the constructor arguments of the worker players (the
+    # settings of the search, not workers)
+    def __init__(self, workers=None, playerKwargs=None):
+        self._workers = workers or os.cpu_count()
+        self._playerKwargs = dict(playerKwargs or {})
+        self._pool = None
+
+    def workers(self):
+        return self._workers
+
+    def _getPool(self):
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self._workers, initializer=_initWorker,
+                initargs=(self._playerKwargs,))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def __del__(self):
+        self.close()
+
+    # Values of the root moves searched at depth (from the point of view of color,
+    # the player to move). Returns None if the budget (in seconds) was not enough to
+    # search all of them, and the merged node statistics of the workers.
+    def alphaBeta(self, board, color, depth, rootMoves, budget):
+        history = list(board._historyMoveNames)
+        deadline = time.time() + budget
+        tasks = [(history, color, m, depth, deadline) for m in rootMoves]
+        values = {}
+        reachedDepthLimit = False
+        stats = {}
+        complete = True
+        for move, value, reached, moveStats in self._getPool().imap_unordered(_searchRootMove, tasks):
+            if value is None:
+                complete = False
+                continue
+            values[move] = value
+            reachedDepthLimit = reachedDepthLimit or reached
+            for k, v in moveStats.items():
+                stats[k] = stats.get(k, 0) + v
+        if not complete:
+            return None, reachedDepthLimit, stats
+        return values, reachedDepthLimit, stats
+
+    # Root parallel MCTS: every worker searches the position with its own tree
+    # (playouts are split between the workers, or each one uses timeBudget) and
+    # the (visits, wins) of the root children are summed
+    def mcts(self, board, color, playouts, timeBudget):
+        history = list(board._historyMoveNames)
+        share = None if playouts is None else max(1, playouts // self._workers)
+        tasks = [(history, color, share, timeBudget)] * self._workers
+        merged = {}
+        nbPlayouts = 0
+        for children, stats in self._getPool().imap_unordered(_searchMcts, tasks):
+            nbPlayouts += stats["playouts"]
+            for move, (visits, wins) in children.items():
+                v, w = merged.get(move, (0, 0.0))
+                merged[move] = (v + visits, w + wins)
+        return merged, nbPlayouts
+
+# Root values of myPlayer(**kwargs) at depth on the positions of the benchmark
+def _rootValues(depth, **kwargs):
+    import myPlayer
+    import benchmark
+    player = myPlayer.myPlayer(**kwargs)
+    values = []
+    for history in benchmark.suitePositions():
+        player._board = benchmark.replay(history)
+        player.newGame(player._board._nextPlayer)
+        player._tt.clear()
+        player._ordering.clear()
+        player.MaxMinCoupAB(depth)
+        values.append(player._rootValues)
+    if player._parallel is not None:
+        player._parallel.close()
+    return values
+
+if __name__ == "__main__":
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    settings = {"evalWeights": {"stones": 0, "area": 1, "liberties": 1}, "tacticalReading": False}
+    serial = _rootValues(depth, **settings)
+    parallel = _rootValues(depth, workers=2, **settings)
+    for i, (s, p) in enumerate(zip(serial, parallel)):
+        assert s == p, "position %d: %d root values differ" % (i, sum(s[m] != p.get(m) for m in s))
+    print("%d positions: same root values with 1 and 2 workers" % len(serial))
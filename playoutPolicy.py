@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+''' Fast playout policy for the Monte Carlo players.
+
+    A uniformly random player spends most of its moves filling its own eyes, and
+    its games only end when the board is full. This policy never fills a single
+    point true eye of its own color, so the playouts end (with two passes) as
+    soon as the remaining moves would only fill eyes. Before playing at random,
+    it captures a string put in atari by the last move, or saves its own string
+    in atari, read from the liberties of the strings (Board._stringLiberties)
+    around the last move.
+
+    The random move is drawn among the empty points and only this point is
+    checked, instead of building the list of all the legal moves.
+
+    Works on Goban.Board (the array backend): it reads the strings and their
+    liberties.
+'''
+
+import random
+import Goban
+
+class PlayoutPolicy:
+
+    def __init__(self, rng=None):
+        self._rng = rng or random.Random()
+
+    # A single point eye of color: all the neighbors are stones of color, and the
+    # opponent does not hold the diagonals (none of them on the edges, at most one
+    # in the center), so that the eye can not be made false
+    @staticmethod
+    def isEye(board, fcoord, color):
+        if board._nbEmptyNeighbors[fcoord] != 0:
+            return False
+        cells = board._board
+        neighbors = board._neighbors
+        i = board._neighborsEntries[fcoord]
+        while neighbors[i] != -1:
+            if cells[neighbors[i]] != color:
+                return False
+            i += 1
+        opponent = Goban.Board.flip(color)
+        diagonals = board._tables.diagonals[fcoord]
+        nbOpponents = 0
+        for fd in diagonals:
+            if cells[fd] == opponent:
+                nbOpponents += 1
+        return nbOpponents == 0 if len(diagonals) < 4 else nbOpponents < 2
+
+    # Captures of the strings in atari next to the last move (including the
+    # string of the last move), then escapes of own strings in atari there
+    def tacticalMoves(self, board, lastMove):
+        if lastMove < 0 or board._board[lastMove] == Goban.Board._EMPTY:
+            return []
+        color = board._nextPlayer
+        strings = set([board.getStringOfStone(lastMove)])
+        i = board._neighborsEntries[lastMove]
+        while board._neighbors[i] != -1:
+            fn = board._neighbors[i]
+            if board._board[fn] != Goban.Board._EMPTY:
+                strings.add(board.getStringOfStone(fn))
+            i += 1
+        captures = []
+        escapes = []
+        for string in strings:
+            liberty = board.lastLiberty(string)
+            if liberty is not None:
+                (escapes if board._board[string] == color else captures).append(liberty)
+        return captures + escapes
+
+    # Move of the next player (-1 to pass): lastMove is the move played just before
+    # (-1 for a pass or if it is not known)
+    def chooseMove(self, board, lastMove=-1):
+        color = board._nextPlayer
+        for fcoord in self.tacticalMoves(board, lastMove):
+            if board.isLegalMove(fcoord) and not self.isEye(board, fcoord, color):
+                return fcoord
+        candidates = list(board._empties)
+        rng = self._rng
+        while candidates:
+            i = rng.randrange(len(candidates))
+            fcoord = candidates[i]
+            if not self.isEye(board, fcoord, color) and board.isLegalMove(fcoord):
+                return fcoord
+            candidates[i] = candidates[-1]
+            candidates.pop()
+        return -1
+
+    # Plays until the end of the game (or maxMoves moves) with push_fcoord, and
+    # returns the number of moves played
+    def playout(self, board, maxMoves):
+        lastMove = -1
+        if board._historyMoveNames:
+            lastMove = board.nameToFcoord(board._historyMoveNames[-1])
+        nbMoves = 0
+        while not board.is_game_over() and nbMoves < maxMoves:
+            lastMove = self.chooseMove(board, lastMove)
+            board.push_fcoord(lastMove)
+            nbMoves += 1
+        return nbMoves
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+''' Self-play generation of labelled positions, to tune the evaluation.
+
+    The games are played headless by a pool of worker processes (see
+    tournament.playBoard), player1 being black in the even games. The positions
+    of each game (the board before each move) are labelled with the side to play
+    and the winner of the game, and appended by the main process to the shards of
+    the dataset directory:
+     - shard00000.bin, shard00001.bin...: fixed size records (see recordType) one
+       after the other, with no header, so that a shard is read as a NumPy array
+       with np.memmap (see openShards),
+     - games.gor: the records of the games (see gameRecord),
+     - meta.json: the board size, the number of games played and the size of
+       each file, written after each game.
+
+    A position whose Zobrist hash (with the side to play) is already in the
+    dataset is not written again. The generation can be stopped at any time and
+    resumed: the files are cut back to the sizes of meta.json (a game half
+    written is dropped) and the games go on from the next one.
+
+    Usage:
+      python selfPlay.py data myPlayer.myPlayer mctsPlayer.mctsPlayer -n 1000 -j 8
+'''
+
+import os
+import json
+import argparse
+import concurrent.futures
+import numpy as np
+import Goban
+import gameRecord
+import tournament
+
+def recordType(size):
+    return np.dtype([("board", "i1", (size * size,)), ("toPlay", "i1"), ("winner", "i1"),
+        ("ply", "<u2"), ("game", "<u4"), ("hash", "<u8")])
+
+# Plays the game and returns its index, its record and its positions (as an
+# array of records, without the game index)
+def _playTask(task):
+    black, white, gameIndex = task
+    board, winner, _, _ = tournament.playBoard(black, white)
+    record = gameRecord.fromBoard(board)
+    positions = np.zeros(len(record.moves), dtype=recordType(record.size))
+    for _, ply, replayed in gameRecord.replayGames([record]):
+        if ply == len(record.moves):
+            break
+        position = positions[ply]
+        position["board"] = replayed._board
+        position["toPlay"] = replayed._nextPlayer
+        position["ply"] = ply
+        position["hash"] = replayed._currentHash
+    positions["winner"] = winner
+    return gameIndex, record, positions
+
+class SelfPlayDataset:
+    ''' The shards, the archive of the games and meta.json of a dataset directory '''
+
+    def __init__(self, directory, size=Goban.Board._BOARDSIZE, shardSize=1 << 20):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._metaPath = os.path.join(directory, "meta.json")
+        if os.path.exists(self._metaPath):
+            with open(self._metaPath) as f:
+                self._meta = json.load(f)
+        else:
+            self._meta = {"size": size, "shardSize": shardSize, "games": 0, "shards": [], "archiveBytes": 0}
+        self._recordType = recordType(self._meta["size"])
+        self._restore()
+        self._seen = set()
+        for shard in _mapShards(directory, self._meta):
+            self._seen.update((shard["hash"].astype(object) * 2 + (shard["toPlay"] == Goban.Board._WHITE)).tolist())
+
+    # Cuts the files back to the sizes of meta.json
+    def _restore(self):
+        shards = self._meta["shards"]
+        for i, count in enumerate(shards):
+            self._truncate(self._shardPath(i), count * self._recordType.itemsize)
+        i = len(shards)
+        while os.path.exists(self._shardPath(i)): # started but never recorded
+            os.remove(self._shardPath(i))
+            i += 1
+        self._truncate(self._archivePath(), self._meta["archiveBytes"])
+
+    @staticmethod
+    def _truncate(path, size):
+        with open(path, "ab") as f:
+            f.truncate(size)
+
+    def _shardPath(self, i):
+        return os.path.join(self._directory, "shard%05d.bin" % i)
+
+    def _archivePath(self):
+        return os.path.join(self._directory, "games.gor")
+
+    def nbGames(self):
+        return self._meta["games"]
+
+    def nbPositions(self):
+        return sum(self._meta["shards"])
+
+    # Appends the game and its new positions, returns the number of positions written
+    def append(self, gameIndex, record, positions):
+        keys = (positions["hash"].astype(object) * 2 + (positions["toPlay"] == Goban.Board._WHITE)).tolist()
+        new = []
+        for i, key in enumerate(keys):
+            if key not in self._seen:
+                self._seen.add(key)
+                new.append(i)
+        positions = positions[new]
+        positions["game"] = gameIndex
+        shards = self._meta["shards"]
+        start = 0
+        while start < len(positions):
+            if not shards or shards[-1] == self._meta["shardSize"]:
+                shards.append(0)
+            count = min(len(positions) - start, self._meta["shardSize"] - shards[-1])
+            with open(self._shardPath(len(shards) - 1), "ab") as f:
+                f.write(positions[start:start + count].tobytes())
+            shards[-1] += count
+            start += count
+        with open(self._archivePath(), "ab") as f:
+            data = gameRecord.encode(record)
+            f.write(data)
+        self._meta["archiveBytes"] += len(data)
+        self._meta["games"] = gameIndex + 1
+        temporary = self._metaPath + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(temporary, self._metaPath) # meta.json is never half written
+        return len(positions)
+
+# The shards of the dataset as read only NumPy arrays of records (mapped, not read)
+def openShards(directory):
+    with open(os.path.join(directory, "meta.json")) as f:
+        return _mapShards(directory, json.load(f))
+
+def _mapShards(directory, meta):
+    dtype = recordType(meta["size"])
+    return [np.memmap(os.path.join(directory, "shard%05d.bin" % i), dtype=dtype, mode="r", shape=(count,))
+        for i, count in enumerate(meta["shards"]) if count]
+
+# Plays the games of the dataset (nbGames in all) that are not played yet, and
+# yields (game index, number of positions written) as they are appended
+def generate(directory, player1, player2, nbGames, workers=1, shardSize=1 << 20):
+    dataset = SelfPlayDataset(directory, shardSize=shardSize)
+    tasks = tournament.gameTasks(player1, player2, nbGames)[dataset.nbGames():]
+    if workers <= 1:
+        for gameIndex, record, positions in map(_playTask, tasks):
+            yield gameIndex, dataset.append(gameIndex, record, positions)
+        return
+    # Non daemonic processes, see tournament.runTournament
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        # in the order of the games: meta.json only has to count them
+        for gameIndex, record, positions in executor.map(_playTask, tasks):
+            yield gameIndex, dataset.append(gameIndex, record, positions)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Writes the positions of self-play games to a dataset")
+    parser.add_argument("directory", help="dataset directory (resumed if it exists)")
+    parser.add_argument("player1", help="module.Class of the first player")
+    parser.add_argument("player2", help="module.Class of the second player")
+    parser.add_argument("--args1", default="{}", help="JSON keyword arguments of the first player")
+    parser.add_argument("--args2", default="{}", help="JSON keyword arguments of the second player")
+    parser.add_argument("-n", "--games", type=int, default=100, help="total number of games of the dataset")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="parallel games")
+    parser.add_argument("--shard-size", type=int, default=1 << 20, help="positions per shard")
+    args = parser.parse_args(argv)
+
+    player1 = (args.player1, json.loads(args.args1))
+    player2 = (args.player2, json.loads(args.args2))
+    for gameIndex, written in generate(args.directory, player1, player2, args.games, args.workers,
+            args.shard_size):
+        print("game %d: %d new positions" % (gameIndex, written))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+''' Tactical reading of the strings with one or two liberties (ladders and
+    simple capture races), for the searches of myPlayer.
+
+    The reading plays on the board itself with push_fcoord/pop and only looks
+    at a few moves in each position:
+     - the attacker plays on the liberties of a string with two liberties (the
+       ladder), or takes the last liberty of a string in atari,
+     - the defender extends on the last liberty of its string, or captures an
+       attacker string in atari next to it.
+    A string in atari that gets three liberties or more has escaped; the ones
+    still at two liberties are read again. Beyond maxDepth moves, the defender
+    is assumed to escape, so a capture found is always a real one (under the
+    moves considered).
+
+    The results are kept in a small cache keyed by the canonical hash of the
+    position (shared by the 8 symmetric positions, see Goban.Board.canonicalHash)
+    with the side to move, and the stone read. It is cleared when it is full.
+
+    Works on Goban.Board (the array backend): it reads the liberty sets of the
+    strings.
+'''
+
+import Goban
+
+class TacticalReader:
+
+    def __init__(self, maxDepth=40, maxEntries=1 << 16):
+        self._maxDepth = maxDepth
+        self._maxEntries = maxEntries
+        self.clear()
+
+    def clear(self):
+        self._cache = {}
+        self._hits = 0
+        self._reads = 0
+
+    def stats(self):
+        return {"reads": self._reads, "hits": self._hits, "size": len(self._cache)}
+
+    # The points and the moves are stored as seen in the canonical position
+    def _cached(self, board, fcoord, kind, read, depth):
+        hashKey, transform = board.canonicalHash()
+        key = (hashKey * 2 + (board._nextPlayer == Goban.Board._WHITE),
+            board.transformFcoord(fcoord, transform), kind)
+        if key in self._cache:
+            self._hits += 1
+            move = self._cache[key]
+            return None if move is None else board.untransformFcoord(move, transform)
+        self._reads += 1
+        move = read(board, fcoord, depth)
+        if len(self._cache) >= self._maxEntries:
+            self._cache.clear()
+        self._cache[key] = None if move is None else board.transformFcoord(move, transform)
+        return move
+
+    # A move of the next player capturing the (opponent) string of fcoord, even if
+    # the defender answers, None if the string can not be captured this way
+    def captureMove(self, board, fcoord):
+        if board._board[fcoord] != Goban.Board.flip(board._nextPlayer):
+            return None
+        return self._cached(board, fcoord, "capture", self._capture, 0)
+
+    # A move of the next player saving its string of fcoord from the atari, None
+    # if the string is not in atari or can not be saved
+    def escapeMove(self, board, fcoord):
+        if board._board[fcoord] != board._nextPlayer or not board.isInAtari(fcoord):
+            return None
+        return self._cached(board, fcoord, "escape", self._escape, 0)
+
+    def _capture(self, board, fcoord, depth):
+        liberties = board.stringLiberties(fcoord)
+        if liberties & (liberties - 1) == 0: # in atari
+            move = liberties.bit_length() - 1
+            return move if board.isLegalMove(move) else None
+        if depth >= self._maxDepth or bin(liberties).count("1") > 2:
+            return None
+        first = liberties & -liberties
+        for bit in (first, liberties ^ first):
+            move = bit.bit_length() - 1
+            if not board.isLegalMove(move):
+                continue
+            board.push_fcoord(move)
+            captured = (board.isInAtari(fcoord)
+                and self._cached(board, fcoord, "escape", self._escape, depth + 1) is None)
+            board.pop()
+            if captured:
+                return move
+        return None
+
+    def _escape(self, board, fcoord, depth):
+        liberty = board.lastLiberty(fcoord)
+        if depth >= self._maxDepth:
+            return liberty
+        # Captures of the attacker strings in atari around the string, then the
+        # extension on the last liberty
+        color = board._board[fcoord]
+        moves = []
+        for fc in board.stringStones(fcoord):
+            i = board._neighborsEntries[fc]
+            while board._neighbors[i] != -1:
+                fn = board._neighbors[i]
+                i += 1
+                if board._board[fn] != Goban.Board._EMPTY and board._board[fn] != color:
+                    move = board.lastLiberty(fn)
+                    if move is not None and move not in moves:
+                        moves.append(move)
+        if liberty not in moves:
+            moves.append(liberty)
+        for move in moves:
+            if not board.isLegalMove(move):
+                continue
+            board.push_fcoord(move)
+            nbLiberties = bin(board.stringLiberties(fcoord)).count("1")
+            escaped = nbLiberties >= 3 or (nbLiberties == 2
+                and self._cached(board, fcoord, "capture", self._capture, depth + 1) is None)
+            board.pop()
+            if escaped:
+                return move
+        return None
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+''' Replays random games on both board backends and checks that they agree move
+    for move (legal moves, stones, captures, end of game, area scores and result),
+    and that the score of the settled positions (see endgame.py) is the area score.
+    Usage: python testBackends.py [nbGames] [boardSize]
+'''
+
+import sys
+import random
+import Goban
+import endgame
+
+BACKENDS = ["array", "bitboard"]
+
+def checkSameBoards(boards, context):
+    first = boards[0]
+    for other in boards[1:]:
+        assert sorted(first.legal_moves()) == sorted(other.legal_moves()), context
+        assert (first._board == other._board).all(), context
+        for attribute in ["_nbBLACK", "_nbWHITE", "_capturedBLACK", "_capturedWHITE",
+                "_nextPlayer", "_lastPlayerHasPassed"]:
+            assert getattr(first, attribute) == getattr(other, attribute), (context, attribute)
+        assert first.is_game_over() == other.is_game_over(), context
+        assert first.result() == other.result(), context
+        assert first.score() == other.score(), context
+        assert first.areaOwners() == other.areaOwners(), context
+    for b in boards:
+        if endgame.canBeSettled(b):
+            assert endgame.settledScore(b) in (None, b.score()), context
+
+# A white stone left in a two point eye of black (5x5, black to move): capturing
+# it is still worth two points, the position is not settled
+def checkDeadStoneInTerritory():
+    white, eye, empty = 24, 0, 23
+    blackStones = [fc for fc in range(25) if fc not in (white, eye, empty)]
+    for backend in BACKENDS:
+        board = Goban.Board(backend=backend, size=5, komi=0.5)
+        board.push_fcoord(blackStones[0])
+        board.push_fcoord(white)
+        for fc in blackStones[1:]:
+            board.push_fcoord(fc)
+            board.push_fcoord(-1)
+        assert board._nextPlayer == Goban.Board._BLACK and not board.is_game_over(), backend
+        assert board.score() == (23, 1.5), backend
+        assert endgame.settledScore(board) is None and endgame.settledResult(board) is None, backend
+        assert empty in endgame.meaningfulMoves(board), backend
+        board.push_fcoord(empty)
+        assert endgame.settledScore(board) == board.score() == (25, 0.5), backend
+
+# Each move is chosen at random among the legal moves (PASS is rare, so that the
+# games reach captures and ko fights). Sometimes a few moves are pushed and popped
+# before, to check that pop() restores the same status on both backends
+def replayRandomGame(seed, maxMoves=300, size=None):
+    rng = random.Random(seed)
+    boards = [Goban.Board(backend=backend, size=size) for backend in BACKENDS]
+    nbMoves = 0
+    while not boards[0].is_game_over() and nbMoves < maxMoves:
+        context = "game %d, move %d" % (seed, nbMoves)
+        checkSameBoards(boards, context)
+        if rng.random() < 0.2:
+            excursion = []
+            for _ in range(rng.randint(1, 4)):
+                if boards[0].is_game_over():
+                    break
+                excursion.append(rng.choice(sorted(boards[0].legal_moves())))
+                for b in boards:
+                    b.push(excursion[-1])
+                checkSameBoards(boards, context + " (excursion)")
+            for _ in excursion:
+                for b in boards:
+                    b.pop()
+            checkSameBoards(boards, context + " (after pop)")
+        moves = sorted(boards[0].legal_moves())
+        stoneMoves = [m for m in moves if m != "PASS"]
+        if stoneMoves and rng.random() < 0.95:
+            move = rng.choice(stoneMoves)
+        else:
+            move = "PASS"
+        for b in boards:
+            b.push(move)
+        nbMoves += 1
+    checkSameBoards(boards, "game %d, end" % seed)
+    return nbMoves
+
+if __name__ == "__main__":
+    checkDeadStoneInTerritory()
+    nbGames = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    for seed in range(nbGames):
+        nbMoves = replayRandomGame(seed, maxMoves=4 * (size or Goban.Board._BOARDSIZE)**2, size=size)
+        print("game %d: %d moves, same on all the backends" % (seed, nbMoves))
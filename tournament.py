@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+''' Headless tournament between two players implementing PlayerInterface.
+
+    The games are played by a pool of worker processes, colors alternate from
+    one game to the next, nothing is printed during the games (the output of the
+    players is discarded) and each game gives one line of results (CSV or JSONL,
+    chosen by the extension of the output file).
+
+    Usage:
+      python tournament.py myPlayer.myPlayer randomPlayer.randomPlayer -n 20 -j 4 -o results.csv
+      python tournament.py mctsPlayer.mctsPlayer myPlayer.myPlayer --args1 '{"playouts": 200}'
+
+    A player is given as module.Class, with the keyword arguments of its
+    constructor as a JSON dictionary.
+'''
+
+import os
+import io
+import csv
+import json
+import math
+import time
+import argparse
+import importlib
+import contextlib
+import concurrent.futures
+import Goban
+
+FIELDS = ["game", "black", "white", "winner", "result", "moves", "blackTime", "whiteTime", "illegalMove"]
+
+def makePlayer(spec, kwargs=None):
+    moduleName, className = spec.rsplit(".", 1)
+    return getattr(importlib.import_module(moduleName), className)(**(kwargs or {}))
+
+# Plays one game, the players being (spec, kwargs) pairs. Returns the final
+# board, the winner (a color, _EMPTY for a draw), the thinking times of black
+# and white and the illegal move that ended the game ("" if none)
+def playBoard(black, white):
+    board = Goban.Board()
+    players = [makePlayer(*black), makePlayer(*white)]
+    colors = [Goban.Board._BLACK, Goban.Board._WHITE]
+    times = [0.0, 0.0]
+    illegalMove = ""
+    winner = None
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        for player, color in zip(players, colors):
+            player.newGame(color)
+        nextPlayer = 0
+        while not board.is_game_over():
+            start = time.perf_counter()
+            move = players[nextPlayer].getPlayerMove()
+            times[nextPlayer] += time.perf_counter() - start
+            if move not in board.legal_moves():
+                illegalMove = move
+                winner = colors[1 - nextPlayer]
+                break
+            board.push(move)
+            players[1 - nextPlayer].playOpponentMove(move)
+            nextPlayer = 1 - nextPlayer
+            output.seek(0) # the output of the players is not kept
+            output.truncate()
+        if winner is None:
+            winner = {"1-0": Goban.Board._WHITE, "0-1": Goban.Board._BLACK}.get(board.result(), Goban.Board._EMPTY)
+        for player in players:
+            player.endGame(winner)
+    return board, winner, times, illegalMove
+
+# Same as playBoard, returns the dictionary of the results (see FIELDS): winner
+# is "black", "white" or "draw"
+def playGame(black, white, gameIndex=0):
+    board, winner, times, illegalMove = playBoard(black, white)
+    return {"game": gameIndex, "black": black[0], "white": white[0],
+            "winner": Goban.Board.playerName(winner) if winner != Goban.Board._EMPTY else "draw",
+            "result": board.result(), "moves": len(board._historyMoveNames),
+            "blackTime": round(times[0], 3), "whiteTime": round(times[1], 3), "illegalMove": illegalMove}
+
+def _playGameTask(task):
+    return playGame(*task)
+
+# Player 1 is black in the even games, white in the odd ones
+def gameTasks(player1, player2, nbGames):
+    return [(player1, player2, i) if i % 2 == 0 else (player2, player1, i) for i in range(nbGames)]
+
+# Plays the games and yields their results as soon as they are finished
+def runTournament(player1, player2, nbGames, workers=1):
+    tasks = gameTasks(player1, player2, nbGames)
+    if workers <= 1:
+        for task in tasks:
+            yield _playGameTask(task)
+        return
+    # Not a multiprocessing.Pool: its processes are daemonic and can not start the
+    # worker processes of a player (myPlayer with workers > 1)
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(_playGameTask, task) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+# Wilson score interval of a proportion (95% with z = 1.96)
+def wilsonInterval(p, n, z=1.96):
+    if n == 0:
+        return 0.0, 1.0
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def eloDifference(score):
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+# Score of the first player (draws count for half a point), with its confidence
+# interval, and the corresponding Elo difference
+def summarize(results):
+    wins = draws = losses = 0
+    for r in results:
+        player1Color = "black" if r["game"] % 2 == 0 else "white"
+        if r["winner"] == "draw":
+            draws += 1
+        elif r["winner"] == player1Color:
+            wins += 1
+        else:
+            losses += 1
+    n = wins + draws + losses
+    score = (wins + 0.5 * draws) / n if n else 0.0
+    low, high = wilsonInterval(score, n)
+    return {"games": n, "wins": wins, "draws": draws, "losses": losses, "score": score,
+            "scoreInterval": (low, high), "elo": eloDifference(score),
+            "eloInterval": (eloDifference(low), eloDifference(high))}
+
+class ResultWriter:
+    ''' Writes the results to a .csv or a .jsonl file (or to nothing) '''
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="") if path else None
+        self._csv = None
+        if path and not path.endswith(".jsonl"):
+            self._csv = csv.DictWriter(self._file, fieldnames=FIELDS)
+            self._csv.writeheader()
+
+    def write(self, result):
+        if self._file is None:
+            return
+        if self._csv is not None:
+            self._csv.writerow(result)
+        else:
+            self._file.write(json.dumps(result) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plays a headless tournament between two players")
+    parser.add_argument("player1", help="module.Class of the first player")
+    parser.add_argument("player2", help="module.Class of the second player")
+    parser.add_argument("--args1", default="{}", help="JSON keyword arguments of the first player")
+    parser.add_argument("--args2", default="{}", help="JSON keyword arguments of the second player")
+    parser.add_argument("-n", "--games", type=int, default=10, help="number of games")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(), help="parallel games")
+    parser.add_argument("-o", "--output", default=None, help="results file (.csv or .jsonl)")
+    args = parser.parse_args(argv)
+
+    player1 = (args.player1, json.loads(args.args1))
+    player2 = (args.player2, json.loads(args.args2))
+    writer = ResultWriter(args.output)
+    results = []
+    start = time.perf_counter()
+    for result in runTournament(player1, player2, args.games, args.workers):
+        writer.write(result)
+        results.append(result)
+    writer.close()
+    summary = summarize(results)
+    print("%d games in %.1fs" % (summary["games"], time.perf_counter() - start))
+    print("%s: %d wins, %d draws, %d losses against %s" % (args.player1, summary["wins"],
+        summary["draws"], summary["losses"], args.player2))
+    print("score %.3f [%.3f, %.3f], Elo difference %.0f [%.0f, %.0f] (95%%)" % (summary["score"],
+        summary["scoreInterval"][0], summary["scoreInterval"][1], summary["elo"],
+        summary["eloInterval"][0], summary["eloInterval"][1]))
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+''' Bounded transposition table for the alpha-beta searches of myPlayer.
+
+    The table is an array of buckets of two slots (two-tier replacement): the
+    first slot keeps the entry searched at the greatest depth, the second one is
+    always replaced. The number of buckets is derived from a memory cap, so the
+    table never grows during a game.
+
+    Entries are tuples (key, depth, value, bound, move). The key must already
+    include the side to move (see myPlayer._ttKey).
+'''
+
+import sys
+
+EXACT = 0
+LOWER = 1 # the value is a lower bound (the search failed high, beta cut)
+UPPER = 2 # the value is an upper bound (the search failed low)
+
+# Approximate size of one entry (tuple + ints) plus its slot in the lists
+ENTRY_BYTES = sys.getsizeof((0, 0, 0, 0, 0)) + 4 * sys.getsizeof(2**62) + 8
+
+class TranspositionTable:
+
+    def __init__(self, maxBytes=16 * 2**20):
+        self._nbBuckets = max(1, maxBytes // (2 * ENTRY_BYTES))
+        self.clear()
+
+    def clear(self):
+        self._deepest = [None] * self._nbBuckets
+        self._recent = [None] * self._nbBuckets
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._replacements = 0
+
+    # Returns the entry (key, depth, value, bound, move) stored for key, or None
+    def probe(self, key):
+        bucket = key % self._nbBuckets
+        entry = self._deepest[bucket]
+        if entry is not None and entry[0] == key:
+            self._hits += 1
+            return entry
+        entry = self._recent[bucket]
+        if entry is not None and entry[0] == key:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        return None
+
+    def store(self, key, depth, value, bound, move):
+        bucket = key % self._nbBuckets
+        entry = (key, depth, value, bound, move)
+        self._stores += 1
+        deepest = self._deepest[bucket]
+        if deepest is None or deepest[0] == key or depth >= deepest[1]:
+            if deepest is not None and deepest[0] != key:
+                # the previous deepest entry is still worth keeping in the other slot
+                self._recent[bucket] = deepest
+                self._replacements += 1
+            self._deepest[bucket] = entry
+        else:
+            if self._recent[bucket] is not None and self._recent[bucket][0] != key:
+                self._replacements += 1
+            self._recent[bucket] = entry
+
+    def size(self):
+        return sum(1 for e in self._deepest if e is not None) + sum(1 for e in self._recent if e is not None)
+
+    def capacity(self):
+        return 2 * self._nbBuckets
+
+    def stats(self):
+        probes = self._hits + self._misses
+        return {"hits": self._hits, "misses": self._misses,
+                "hitRate": self._hits / probes if probes else 0.0,
+                "stores": self._stores, "replacements": self._replacements,
+                "size": self.size(), "capacity": self.capacity()}